@@ -0,0 +1,67 @@
+# Compares the presence-matrix based `find_introduced_stations` from `bss.cleansing`
+# with the per-station resampling previously used in `0-cleanup.py`. Checks that both
+# find the same stations and prints the runtime of each.
+#
+# usage: python3 bench_find_introduced_stations.py [<trips csv>]
+#
+# Without a trips file, a synthetic year of trips with some stations that are
+# introduced or removed during the year is generated.
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append('..')
+from bss.cleansing import find_introduced_stations
+from synthetic import synthetic_trips
+
+# the original implementation of `find_introduced_stations`, used as reference
+def get_station_invisibility_loop(dataframe, station_name):
+    month_start = dataframe.index.min()
+    month_end = dataframe.index.max()
+    days = pd.DataFrame(index=pd.date_range(month_start.date(), month_end.date(), freq="D"))
+    station_history = dataframe[dataframe.start_station_name == station_name].resample('D').count()
+    station_history.index = station_history.index.map(lambda x: x.date())
+    station_history = days.join(station_history, how='outer')
+    nulldays = station_history.start_station_name.isnull().sum()
+    return nulldays
+
+def find_introduced_stations_loop(dataframe):
+    bad_stations = []
+    for s in dataframe.start_station_name.drop_duplicates():
+        if get_station_invisibility_loop(dataframe, s) > 2:
+            bad_stations.append(s)
+    return bad_stations
+
+if len(sys.argv) > 1:
+    dataset = pd.read_csv(sys.argv[1], usecols=[
+            'started_at',
+            'ended_at',
+            'duration',
+            'start_station_name',
+            'end_station_name'
+        ], parse_dates=['started_at', 'ended_at'], index_col=0)
+else:
+    dataset = synthetic_trips(n_trips=2000000, n_stations=400, n_days=365, start='2019-01-01')
+    # let every 20th station only appear after a random day of the year
+    rng = np.random.RandomState(1)
+    for i in range(0, 400, 20):
+        introduced = dataset.index < pd.Timestamp('2019-01-01') + pd.Timedelta(days=rng.randint(0, 365))
+        dataset.loc[introduced & (dataset.start_station_name == 'station {0}'.format(i)), 'start_station_name'] = 'station 1'
+
+print('{0} trips, {1} stations'.format(len(dataset), len(dataset.start_station_name.unique())))
+
+start = time.perf_counter()
+reference = find_introduced_stations_loop(dataset)
+time_loop = time.perf_counter() - start
+
+start = time.perf_counter()
+result = find_introduced_stations(dataset)
+time_vectorized = time.perf_counter() - start
+
+assert reference == result, (reference, result)
+print('outputs are identical ({0} introduced stations).'.format(len(result)))
+print('loop:       {0:.3f}s'.format(time_loop))
+print('vectorized: {0:.3f}s'.format(time_vectorized))
+print('speedup:    {0:.1f}x'.format(time_loop / time_vectorized))
@@ -0,0 +1,60 @@
+# Compares the vectorized `remove_unused_stations` from `bss.cleansing` with the
+# per-station loop previously used in `0-cleanup.py`. Checks that both produce the
+# same dataset and prints the runtime of each.
+#
+# usage: python3 bench_remove_unused_stations.py [<trips csv>] [<threshold>]
+#
+# Without a trips file, a synthetic month of trips is generated.
+
+import sys
+import time
+import pandas as pd
+
+sys.path.append('..')
+from bss.cleansing import remove_unused_stations
+from synthetic import synthetic_trips
+
+# the original implementation of `remove_unused_stations`, used as reference
+def remove_unused_stations_loop(dataframe, threshold):
+    dataframe_copy = dataframe.copy()
+    stations_dep = dataframe.groupby('start_station_name')
+    stations_arr = dataframe.groupby('end_station_name')
+    for s in stations_arr.groups.keys():
+        num_arrivals = len(stations_arr.groups[s])
+        if num_arrivals < threshold:
+            dataframe_copy = dataframe_copy[dataframe_copy['start_station_name'] != s]
+            dataframe_copy = dataframe_copy[dataframe_copy['end_station_name'] != s]
+    for s in stations_dep.groups.keys():
+        num_departures = len(stations_dep.groups[s])
+        if num_departures < threshold:
+            dataframe_copy = dataframe_copy[dataframe_copy['start_station_name'] != s]
+            dataframe_copy = dataframe_copy[dataframe_copy['end_station_name'] != s]
+    return dataframe_copy
+
+if len(sys.argv) > 1:
+    dataset = pd.read_csv(sys.argv[1], usecols=[
+            'started_at',
+            'ended_at',
+            'duration',
+            'start_station_name',
+            'end_station_name'
+        ], parse_dates=['started_at', 'ended_at'], index_col=0)
+else:
+    dataset = synthetic_trips()
+threshold = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+print('{0} trips, {1} stations, threshold {2}'.format(len(dataset), len(dataset.start_station_name.unique()), threshold))
+
+start = time.perf_counter()
+reference = remove_unused_stations_loop(dataset, threshold)
+time_loop = time.perf_counter() - start
+
+start = time.perf_counter()
+result = remove_unused_stations(dataset, threshold)
+time_vectorized = time.perf_counter() - start
+
+pd.testing.assert_frame_equal(reference, result)
+print('outputs are identical ({0} trips remaining).'.format(len(result)))
+print('loop:       {0:.3f}s'.format(time_loop))
+print('vectorized: {0:.3f}s'.format(time_vectorized))
+print('speedup:    {0:.1f}x'.format(time_loop / time_vectorized))
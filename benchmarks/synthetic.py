@@ -0,0 +1,21 @@
+# Generates synthetic trips data for the benchmarks, in the same format as the
+# records produced by the cleansing.
+
+import numpy as np
+import pandas as pd
+
+# generates n_trips trips between n_stations stations over n_days days starting at start.
+# The popularity of the stations is skewed, so that some stations are hardly used.
+def synthetic_trips(n_trips=500000, n_stations=300, n_days=31, start='2019-08-01', seed=42):
+    rng = np.random.RandomState(seed)
+    popularity = rng.lognormal(0.0, 2.5, n_stations)
+    popularity /= popularity.sum()
+    names = np.array(['station {0}'.format(i) for i in range(n_stations)])
+    started_at = pd.Timestamp(start) + pd.to_timedelta(rng.randint(0, n_days * 24 * 60, n_trips), unit='m')
+    duration = rng.randint(60, 3600, n_trips)
+    return pd.DataFrame({
+        'ended_at': started_at + pd.to_timedelta(duration, unit='s'),
+        'duration': duration,
+        'start_station_name': names[rng.choice(n_stations, n_trips, p=popularity)],
+        'end_station_name': names[rng.choice(n_stations, n_trips, p=popularity)]
+    }, index=pd.Index(started_at, name='started_at')).sort_index()
@@ -0,0 +1,4 @@
+# Shared helpers for the pipelines in `real_analysis`, `validation_simulation`
+# and `extended_simulation`. The scripts in those folders are executed from
+# their own directory, so they make this package importable with
+# `sys.path.append('..')`.
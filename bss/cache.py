@@ -0,0 +1,84 @@
+# Content-hashed cache for artifacts that are expensive to produce and can be
+# shared between the pipelines and between the experiments of a plan.
+#
+# Artifacts are stored in `data/cache/<namespace>/<key>/`. The key is a hash of
+# everything the artifacts depend on (input file contents and settings), so an
+# entry never has to be invalidated: changed inputs simply lead to a new key.
+# (An entry can still be built again and replaced on request, see `store`.)
+# Entries are written to a temporary directory first and renamed afterwards, so
+# that concurrently running pipelines never see incomplete entries.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# location of the cache, shared by all pipelines
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')
+
+# writes obj as json to path, atomically
+def write_json(path, obj):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as file:
+        json.dump(obj, file, indent=4)
+    os.replace(tmp, path)
+
+# returns the sha256 of the contents of the file at path. Hashes are remembered by
+# path, size and modification time, so large input files are only read once.
+def file_hash(path):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    index_file = os.path.join(CACHE_DIR, 'file_hashes.json')
+    hashes = {}
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as file:
+            hashes = json.load(file)
+    entry = hashes.get(path)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    hashes[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+    write_json(index_file, hashes)
+    return digest.hexdigest()
+
+# returns a key for the given parts, which must be serializable as json
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+
+# returns the directory of the entry for key in namespace, or None if there is none
+def lookup(namespace, key):
+    directory = os.path.join(CACHE_DIR, namespace, key)
+    return directory if os.path.isdir(directory) else None
+
+# creates the entry for key in namespace by calling write with a directory to write
+# the artifacts to. If replace is True, the artifacts of an existing entry are replaced
+# (each one atomically). Returns the directory of the entry.
+def store(namespace, key, write, replace=False):
+    os.makedirs(os.path.join(CACHE_DIR, namespace), exist_ok=True)
+    directory = os.path.join(CACHE_DIR, namespace, key)
+    tmp = tempfile.mkdtemp(dir=os.path.join(CACHE_DIR, namespace))
+    try:
+        write(tmp)
+        if replace and os.path.isdir(directory):
+            for name in os.listdir(tmp):
+                os.replace(os.path.join(tmp, name), os.path.join(directory, name))
+        else:
+            os.rename(tmp, directory)
+    except OSError:
+        # another process stored the same entry in the meantime
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+    return directory
+
+# copies the artifacts with the given names from the entry in directory to destination
+def fetch(directory, names, destination='.'):
+    for name in names:
+        shutil.copyfile(os.path.join(directory, name), os.path.join(destination, name))
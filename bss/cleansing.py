@@ -0,0 +1,232 @@
+# Functions used for cleansing the historic trips data. They are shared by the
+# `0-cleanup.py` scripts of all pipelines, which only differ in the outputs they
+# write. `cleanse_cached` runs the whole cleansing and caches the results in
+# `data/cache`, keyed by the contents of the input files, the code that produces the
+# results (this module and `bss/records.py`) and the settings below, so the results
+# are shared by all pipelines.
+
+import inspect
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from bss import cache
+from bss.records import read_records, write_records
+
+# settings that influence the cleansed data (without the validation split)
+CLEANSING_SETTINGS = ['duration_min_quantile', 'duration_max_quantile', 'station_usage_threshold']
+
+# artifacts written to the working directory of a pipeline
+STATIONS_FILES = ['stations.csv']
+SPLIT_FILES = ['records.csv', 'records_validation.csv', 'records.npz', 'records_validation.npz']
+
+#############################################################################################
+####[ Helper Functions ]#####################################################################
+#############################################################################################
+
+# return only the entries for weekdays from dataframe
+def only_weekdays(dataframe):
+    return dataframe[dataframe.index.dayofweek < 5]
+
+# return only the entries for weekends from dataframe
+def only_weekends(dataframe):
+    return dataframe[dataframe.index.dayofweek >= 5]
+
+# remove stations from dataset, that have a departure or arrival frequency less than threshold
+# over the whole dataset. Arrivals and departures are counted once for all stations and the
+# affected trips are removed with a single mask.
+def remove_unused_stations(dataframe, threshold, verbose=False):
+    arrivals = dataframe['end_station_name'].value_counts(sort=False)
+    departures = dataframe['start_station_name'].value_counts(sort=False)
+    if len(arrivals) != len(departures):
+        print('WARNING: Stations with no departures/arrivals exist!')
+    unused_arrivals = arrivals[arrivals < threshold].sort_index()
+    unused_departures = departures[departures < threshold].sort_index()
+    if verbose:
+        for s, n in unused_arrivals.items():
+            print('station {0} has only {1} arrivals in the whole month'.format(s, n))
+        for s, n in unused_departures.items():
+            print('station {0} has only {1} departures in the whole month'.format(s, n))
+    unused = unused_arrivals.index.union(unused_departures.index)
+    return dataframe[~(dataframe['start_station_name'].isin(unused) | dataframe['end_station_name'].isin(unused))]
+
+# returns a boolean matrix with one row per station and one column per day from the first to
+# the last day in the dataset. An entry is true if the station has a departure on that day.
+# The matrix is built for all stations at once with a single groupby.
+def get_station_presence(dataframe):
+    days = dataframe.index.normalize()
+    presence = dataframe.groupby([dataframe['start_station_name'], days], observed=True).size().unstack(fill_value=0)
+    presence = presence.reindex(columns=pd.date_range(days.min(), days.max(), freq='D'), fill_value=0)
+    return presence > 0
+
+# returns for every station the number of days that it does not appear in the historic data,
+# that is the days before its first and after its last departure
+def get_station_invisibility(dataframe):
+    presence = get_station_presence(dataframe)
+    visible = presence.values
+    n_days = visible.shape[1]
+    first = visible.argmax(axis=1)
+    last = n_days - 1 - visible[:, ::-1].argmax(axis=1)
+    return pd.Series(first + (n_days - 1 - last), index=presence.index)
+
+#find stations that only appear in the data for len(month) - 2 days or less
+def find_introduced_stations(dataframe):
+    invisibility = get_station_invisibility(dataframe)
+    invisibility = invisibility.reindex(dataframe.start_station_name.drop_duplicates().dropna())
+    return list(invisibility[invisibility > 2].index)
+
+# remove stations that oly appear in the data for len(month) - 2 days or less
+def remove_introduced_stations(dataframe, verbose=False):
+    data = dataframe.copy()
+    bad_stations = find_introduced_stations(data)
+    if verbose: print('removing stations {0}, because they possibly got introduced/removed during the month.'.format(bad_stations))
+    return data[~data.start_station_name.isin(bad_stations)]
+
+# remove entries with a duration lower than the low-th quantile or higher than the high-th quantile
+def remove_duration(dataframe, high, low):
+    high_threshold = dataframe['duration'].quantile(high)
+    low_threshold = dataframe['duration'].quantile(low)
+    return dataframe[(dataframe['duration'] >= low_threshold) & (dataframe['duration'] <= high_threshold)]
+
+#############################################################################################
+####[ Cleansing ]############################################################################
+#############################################################################################
+
+# loads the historic trips from the csv file at path
+def load_trips(path):
+    return pd.read_csv(path, usecols=[
+            'started_at',
+            'ended_at',
+            'duration',
+            'start_station_name',
+            'end_station_name'
+        ], parse_dates=['started_at', 'ended_at'], index_col=0)
+
+# cleanses the historic dataset and the list of stations according to settings.
+# returns the cleansed dataset and stations.
+def cleanse(dataset, stations, settings, verbose=False):
+    if verbose:
+        print('\n--- loading dataset ---')
+        print(dataset.head())
+        print(dataset.describe())
+        print('\n--- loading stations ---')
+        print(stations.head())
+        print(stations.describe())
+
+    # eliminate weekends
+    n = len(dataset)
+    dataset = only_weekdays(dataset)
+    if verbose:
+        print('\n--- removing weekends ---')
+        print('{0} weekend entries removed.'.format(n - len(dataset)))
+
+    # remove stations with neglectable usage. Those probably got introduced halfway
+    # through the month and should be taken account for only in the next month.
+    if verbose: print('\n--- removing unused stations ---')
+    n = len(dataset)
+    dataset = remove_unused_stations(dataset, settings['station_usage_threshold'], verbose)
+    if verbose: print('{0} unused station entries removed.'.format(n - len(dataset)))
+
+    # remove trips with too long/short duration
+    n = len(dataset)
+    dataset = remove_duration(dataset, settings['duration_max_quantile'], settings['duration_min_quantile'])
+    if verbose:
+        print('\n--- removing extreme duration trips ---')
+        print('{0} extreme duration entries removed.'.format(n - len(dataset)))
+
+    # eliminate all stations from dataset that do not appear in the stations data
+    n = len(dataset)
+    dataset = dataset[dataset['start_station_name'].isin(stations.index)]
+    dataset = dataset[dataset['end_station_name'].isin(stations.index)]
+    if verbose:
+        print('\n--- removing stations that are not in the stations list ---')
+        print('{0} entries removed.'.format(n - len(dataset)))
+
+    # eliminate all stations from stations data that do not appear in the dataset
+    n = len(stations)
+    stations = stations[stations.index.isin(dataset['start_station_name'])]
+    stations = stations[stations.index.isin(dataset['end_station_name'])]
+    if verbose:
+        print('\n--- removing stations that are not in the trips anymore ---')
+        print('{0} entries removed.'.format(n - len(stations)))
+
+    return dataset, stations
+
+# splits one randomly chosen day of every weekday off the dataset for validation.
+# returns the remaining dataset and the validation dataset.
+def split_validation(dataset, seed, verbose=False):
+    if verbose:
+        print('-- splitting datasets ---')
+    np.random.seed(seed)
+    validation_days = [dataset[dataset.index.weekday == i].index.day.drop_duplicates().values for i in range(0, 5)]
+    validation_days = [np.random.permutation(w) for w in validation_days]
+    validation_days = list(map(lambda x: x[0], validation_days))
+    if verbose:
+        print('validation days: {0}'.format(validation_days))
+    dataset_split_validation = dataset[dataset.index.day.isin(validation_days)]
+    dataset = dataset[~dataset.index.day.isin(validation_days)]
+    return dataset, dataset_split_validation
+
+#############################################################################################
+####[ Cached Cleansing ]#####################################################################
+#############################################################################################
+
+# reads the info.json of a cache entry
+def _read_info(directory):
+    with open(os.path.join(directory, 'info.json'), 'r') as file:
+        return json.load(file)
+
+# cleanses the data specified in settings and writes `stations.csv` and, if split is
+# true, the training and validation records to destination. Results are taken from the
+# cache if the input files, the cleansing code and the relevant settings are unchanged.
+# Returns a dict with the number of records before cleansing and, if split is true, in
+# the training and validation datasets.
+def cleanse_cached(settings, split=True, destination='.', verbose=False):
+    historic_data = settings['historic_data_location']
+    station_data = settings['stations_data_location']
+    key = cache.make_key(
+        cache.file_hash(historic_data),
+        cache.file_hash(station_data),
+        [cache.file_hash(path) for path in [__file__, inspect.getfile(write_records)]],
+        dict((k, settings[k]) for k in CLEANSING_SETTINGS))
+
+    cleansed = cache.lookup('cleansed', key)
+    if cleansed is None:
+        def write(directory):
+            dataset = load_trips(historic_data)
+            stations = pd.read_csv(station_data, index_col='station_name')
+            dataset_len_old = len(dataset)
+            dataset, stations = cleanse(dataset, stations, settings, verbose)
+            stations.to_csv(os.path.join(directory, 'stations.csv'))
+            write_records(dataset, os.path.join(directory, 'records_cleansed.npz'), stations.index)
+            cache.write_json(os.path.join(directory, 'info.json'), {'dataset_len_old': dataset_len_old})
+        cleansed = cache.store('cleansed', key, write)
+    elif verbose:
+        print('\n--- using cached cleansed data from {0} ---'.format(cleansed))
+    cache.fetch(cleansed, STATIONS_FILES, destination)
+    info = _read_info(cleansed)
+    if not split:
+        return info
+
+    split_key = cache.make_key(key, settings['split_seed'])
+    splitted = cache.lookup('split', split_key)
+    if splitted is None:
+        def write(directory):
+            stations = pd.read_csv(os.path.join(cleansed, 'stations.csv'), index_col='station_name')
+            dataset = read_records(os.path.join(cleansed, 'records_cleansed.npz'))
+            dataset, dataset_split_validation = split_validation(dataset, settings['split_seed'], verbose)
+            dataset.to_csv(os.path.join(directory, 'records.csv'))
+            dataset_split_validation.to_csv(os.path.join(directory, 'records_validation.csv'))
+            write_records(dataset, os.path.join(directory, 'records.npz'), stations.index)
+            write_records(dataset_split_validation, os.path.join(directory, 'records_validation.npz'), stations.index)
+            cache.write_json(os.path.join(directory, 'info.json'), {
+                'dataset_len': len(dataset),
+                'dataset_len_validation': len(dataset_split_validation)
+            })
+        splitted = cache.store('split', split_key, write)
+    elif verbose:
+        print('\n--- using cached validation split from {0} ---'.format(splitted))
+    cache.fetch(splitted, SPLIT_FILES, destination)
+    info.update(_read_info(splitted))
+    return info
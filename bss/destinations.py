@@ -0,0 +1,56 @@
+# Destination probabilities of the trips for each hour of the day.
+#
+# The probability that a trip starting at station s in hour h ends at station d is the
+# share of the trips from s in hour h that ended at d. All (hour, start, end) triples are
+# encoded as one integer, so the counts of all observed pairs follow from a single
+# np.unique. Only pairs that occur in the records are kept, so the size of the result
+# grows with the number of observed origin-destination pairs and not with the square of
+# the number of stations. Like the duration matrix, the probabilities are cached
+# together with the cleaned records.
+
+import os
+import numpy as np
+import pandas as pd
+
+from bss import cache
+from bss.records import read_records
+
+# returns the arrays hours, starts, ends and probabilities with one entry for every
+# (hour of the day, start station id, end station id) that occurs in records, sorted by
+# hour, start and end. records needs the index started_at and the columns
+# start_station_id and end_station_id. Trips ending at stations that are not in the
+# list count for the total of their start station, but have no entry.
+def destination_probabilities(records, n_stations):
+    hours = pd.DatetimeIndex(records.index).hour.values.astype(np.int64)
+    starts = records['start_station_id'].values.astype(np.int64)
+    ends = records['end_station_id'].values.astype(np.int64)
+    departing = starts >= 0
+    hours, starts, ends = hours[departing], starts[departing], ends[departing]
+
+    totals = np.bincount(hours * n_stations + starts, minlength=24 * n_stations)
+    arriving = ends >= 0
+    codes, counts = np.unique((hours[arriving] * n_stations + starts[arriving]) * n_stations + ends[arriving], return_counts=True)
+    hours, rest = np.divmod(codes, n_stations * n_stations)
+    starts, ends = np.divmod(rest, n_stations)
+    return hours, starts, ends, counts / totals[hours * n_stations + starts]
+
+# returns the dense (24, n_stations, n_stations) tensor of the destination probabilities
+# returned by destination_probabilities
+def destination_tensor(hours, starts, ends, probabilities, n_stations):
+    tensor = np.zeros((24, n_stations, n_stations))
+    tensor[hours, starts, ends] = probabilities
+    return tensor
+
+# same as destination_probabilities, but reads the records from the archive at path and
+# caches the results by the contents of the archive
+def load_destination_probabilities(path, n_stations):
+    key = cache.make_key(cache.file_hash(path), n_stations)
+    directory = cache.lookup('destinations', key)
+    if directory is None:
+        def write(directory):
+            records = read_records(path, columns=['start_station_id', 'end_station_id'])
+            hours, starts, ends, probabilities = destination_probabilities(records, n_stations)
+            np.savez(os.path.join(directory, 'destinations.npz'), hours=hours, starts=starts, ends=ends, probabilities=probabilities)
+        directory = cache.store('destinations', key, write)
+    with np.load(os.path.join(directory, 'destinations.npz')) as archive:
+        return archive['hours'], archive['starts'], archive['ends'], archive['probabilities']
@@ -0,0 +1,33 @@
+# Average trip durations between all pairs of stations.
+#
+# The durations are averaged with one groupby over the integer station ids and
+# unstacked into a (n_stations, n_stations) matrix. Pairs without trips get the
+# average duration of all trips. The matrix is cached next to the cleaned records,
+# so parametrizing the model again with different settings does not recompute it.
+
+import os
+import numpy as np
+
+from bss import cache
+from bss.records import read_records
+
+# returns the matrix of the average duration (in the unit of the records, seconds)
+# of the trips from station [start] to station [end]. records needs the columns
+# duration, start_station_id and end_station_id (-1 for stations not in the list).
+def duration_matrix(records, n_stations):
+    known = (records['start_station_id'].values >= 0) & (records['end_station_id'].values >= 0)
+    durations = records[known].groupby(['start_station_id', 'end_station_id'])['duration'].mean().unstack()
+    durations = durations.reindex(index=range(n_stations), columns=range(n_stations))
+    return durations.fillna(records['duration'].mean()).values
+
+# same as duration_matrix, but reads the records from the archive at path and caches
+# the result by the contents of the archive
+def load_duration_matrix(path, n_stations):
+    key = cache.make_key(cache.file_hash(path), n_stations)
+    directory = cache.lookup('durations', key)
+    if directory is None:
+        def write(directory):
+            records = read_records(path, columns=['duration', 'start_station_id', 'end_station_id'])
+            np.save(os.path.join(directory, 'durations.npy'), duration_matrix(records, n_stations))
+        directory = cache.store('durations', key, write)
+    return np.load(os.path.join(directory, 'durations.npy'))
@@ -0,0 +1,101 @@
+# Distances and neighbourhoods of stations.
+#
+# Instead of computing the distance between all pairs of stations, the stations
+# are hashed into a grid of square cells with the side length of the search radius
+# (on coordinates projected to metres). All stations within the radius of a station
+# then lie in its own or one of the eight surrounding cells, so only those pairs are
+# compared. Time and memory grow with the number of stations times the number of
+# neighbours instead of the square of the number of stations.
+
+import numpy as np
+
+# mean earth radius in metres
+R = 6371000
+
+# returns distance between points in lat/lon in meter using the haversine formula
+# see: https://www.movable-type.co.uk/scripts/latlong.html
+def distance(lon1, lon2, lat1, lat2):
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2-lat1)
+    dlamb = np.radians(lon2-lon1)
+    a = np.sin(dphi / 2) * np.sin(dphi / 2) + np.cos(phi1) * np.cos(phi2) * np.sin(dlamb / 2) * np.sin(dlamb / 2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+# returns the coordinates projected to metres. The longitudes are scaled with the
+# smallest cosine of all latitudes, so projected distances never exceed the real ones.
+def project(lon, lat):
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    return R * lon * np.cos(np.abs(lat).max()), R * lat
+
+# returns all pairs (i, j) with i != j, sorted by i and j
+def _all_pairs(n):
+    return np.nonzero(~np.eye(n, dtype=bool))
+
+# returns all pairs (i, j) with i != j that lie in the same or in neighbouring cells
+# of the grid with the given cell size
+def _grid_pairs(x, y, size):
+    cx = np.floor(x / size).astype(np.int64)
+    cy = np.floor(y / size).astype(np.int64)
+    cx -= cx.min() - 1
+    cy -= cy.min() - 1
+    width = cy.max() + 2
+    keys = cx * width + cy
+    order = np.argsort(keys, kind='stable')
+    cells, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    sources = []
+    targets = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = keys + dx * width + dy
+            cell = np.minimum(np.searchsorted(cells, neighbour), len(cells) - 1)
+            found = np.flatnonzero(cells[cell] == neighbour)
+            n = counts[cell[found]]
+            # every station in found is paired with all n stations of the neighbouring cell
+            offsets = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            sources.append(np.repeat(found, n))
+            targets.append(order[np.repeat(starts[cell[found]], n) + offsets])
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    different = sources != targets
+    return sources[different], targets[different]
+
+# returns the arrays sources, targets and distances of all pairs of different stations
+# that are less than radius metres apart (in both directions, sorted by source and
+# target). If radius is None, all pairs are returned.
+def neighbours(lon, lat, radius=None):
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    if radius is None:
+        sources, targets = _all_pairs(len(lon))
+    elif radius <= 0 or len(lon) == 0:
+        sources, targets = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    else:
+        sources, targets = _grid_pairs(*project(lon, lat), radius)
+    distances = distance(lon[sources], lon[targets], lat[sources], lat[targets])
+    if radius is not None:
+        close = distances < radius
+        sources, targets, distances = sources[close], targets[close], distances[close]
+    order = np.lexsort((targets, sources))
+    return sources[order], targets[order], distances[order]
+
+# returns the adjacency list (array of targets) of each of the n stations for the
+# pairs returned by neighbours
+def adjacency_lists(sources, targets, n):
+    return np.split(targets, np.searchsorted(sources, np.arange(1, n)))
+
+# returns the distance of each station to its nearest other station (at a distance
+# greater than zero), by searching with increasing radius
+def nearest_distances(lon, lat, radius=100.0):
+    nearest = np.full(len(lon), np.inf)
+    if len(lon) < 2:
+        return nearest
+    while True:
+        sources, targets, distances = neighbours(lon, lat, radius)
+        positive = distances > 0
+        np.minimum.at(nearest, sources[positive], distances[positive])
+        if np.isfinite(nearest).all() or radius > np.pi * R:
+            return nearest
+        radius *= 2
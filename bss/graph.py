@@ -0,0 +1,101 @@
+# Spatial graph of the stations for the evaluation with SSTL.
+#
+# The graph is written in the `.tra` format read by jSSTL: the list of locations
+# followed by one line `<source> <target> <distance>` for every undirected edge.
+# Edges are only listed once (source < target). Without a maximum distance the graph
+# is complete, otherwise only stations closer than the maximum distance are connected.
+#
+# The SSTL evaluator needs the shortest distances between all locations of the graph.
+# They are written next to the graph (`model.dist`) and cached by the contents of the
+# graph, so the evaluator only has to read them. The file consists of a header of 48
+# bytes (the magic bytes `BSSDIST1`, the number of locations n as little endian int64
+# and the sha256 of the graph file) followed by the n x n matrix as little endian
+# float64 values in row-major order. Unlike in jSSTL (where they have a distance of
+# 0), locations that are not connected have an infinite distance, so they are never
+# within a distance bound of each other.
+
+import hashlib
+import os
+import shutil
+import numpy as np
+
+from bss import cache
+from bss.geo import distance, neighbours
+
+# magic bytes at the beginning of a distance matrix file
+DISTANCES_MAGIC = b'BSSDIST1'
+
+# returns the arrays sources, targets and distances of the edges between the stations
+# (with sources < targets, sorted by source and target)
+def graph_edges(lon, lat, max_distance=None):
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    if max_distance is None:
+        sources, targets = np.triu_indices(len(lon), 1)
+        return sources, targets, distance(lon[sources], lon[targets], lat[sources], lat[targets])
+    sources, targets, distances = neighbours(lon, lat, max_distance)
+    upper = sources < targets
+    return sources[upper], targets[upper], distances[upper]
+
+# returns the weights of the edges as they are written to (and read from) the graph file
+def edge_weights(distances):
+    return np.round(distances, 2)
+
+# writes the graph with n_locations locations and the given edges to path
+def write_tra(path, n_locations, sources, targets, distances):
+    with open(path, 'w+') as file:
+        file.write('LOCATIONS\n')
+        file.write(''.join('{0}\n'.format(i) for i in range(n_locations)))
+        file.write('EDGES\n')
+        np.savetxt(file, np.column_stack([sources, targets, edge_weights(distances)]), fmt='%d %d %.2f')
+
+# returns the matrix of the shortest distances between all locations of the graph
+# (Floyd-Warshall, like jSSTL; unconnected locations keep an infinite distance)
+def shortest_distances(n_locations, sources, targets, distances):
+    matrix = np.full((n_locations, n_locations), np.inf)
+    np.fill_diagonal(matrix, 0.0)
+    weights = edge_weights(distances)
+    np.minimum.at(matrix, (sources, targets), weights)
+    np.minimum.at(matrix, (targets, sources), weights)
+    for k in range(n_locations):
+        np.minimum(matrix, matrix[:, k, np.newaxis] + matrix[np.newaxis, k, :], out=matrix)
+    return matrix
+
+# returns the locations that are not connected to the largest component of the graph
+# with the given matrix of shortest distances
+def disconnected_locations(matrix):
+    connected = np.isfinite(matrix)
+    return np.flatnonzero(~connected[connected.sum(axis=1).argmax()])
+
+# writes the distance matrix for the graph in the file graph_path to path
+def write_distances(path, matrix, graph_path):
+    with open(graph_path, 'rb') as file:
+        graph_hash = hashlib.sha256(file.read()).digest()
+    with open(path, 'wb') as file:
+        file.write(DISTANCES_MAGIC)
+        file.write(np.array([len(matrix)], dtype='<i8').tobytes())
+        file.write(graph_hash)
+        file.write(np.ascontiguousarray(matrix, dtype='<f8').tobytes())
+
+# reads the distance matrix from path
+def read_distances(path):
+    with open(path, 'rb') as file:
+        if file.read(8) != DISTANCES_MAGIC:
+            raise ValueError('{0} is not a distance matrix file'.format(path))
+        n = int(np.frombuffer(file.read(8), dtype='<i8')[0])
+        file.read(32)
+        return np.frombuffer(file.read(), dtype='<f8').reshape(n, n)
+
+# writes the distance matrix for the graph with the given edges (written to graph_path
+# before) next to the graph, with the extension .dist. The matrix is cached by the
+# contents of the graph file (and of this file), so it is only computed once for the
+# same set of stations. Returns the matrix.
+def write_distances_cached(graph_path, n_locations, sources, targets, distances):
+    key = cache.make_key(cache.file_hash(__file__), cache.file_hash(graph_path))
+    directory = cache.lookup('distances', key)
+    if directory is None:
+        def write(directory):
+            write_distances(os.path.join(directory, 'model.dist'), shortest_distances(n_locations, sources, targets, distances), graph_path)
+        directory = cache.store('distances', key, write)
+    shutil.copyfile(os.path.join(directory, 'model.dist'), os.path.splitext(graph_path)[0] + '.dist')
+    return read_distances(os.path.join(directory, 'model.dist'))
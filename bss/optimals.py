@@ -0,0 +1,67 @@
+# Optimal initial allocation of bikes to stations.
+#
+# The number of available bikes of a station over the day is its initial number of
+# bikes plus the cumulative net change (see `bss/profiles.py`). To keep it between
+# margin and capacity - margin at all hours, the initial number of bikes has to lie in
+# [margin - min(cumsum), capacity - margin - max(cumsum)]. The allocation chosen is the
+# centre of that interval, which keeps the largest distance to both bounds. If the
+# interval is empty (the demand swing is larger than capacity - 2 * margin), the centre
+# is still the best compromise, because it splits the violation evenly between
+# running empty and running full.
+
+import numpy as np
+
+# number of bikes/slots that should be left at all times
+MARGIN = 4
+
+# returns the lower and upper bound for the initial number of bikes of each station,
+# such that its availability stays within margin and capacity - margin
+def feasible_range(net_change, capacity, margin=MARGIN):
+    levels = np.cumsum(net_change, axis=-1)
+    lower = margin - levels.min(axis=-1)
+    upper = np.asarray(capacity, dtype=float) - margin - levels.max(axis=-1)
+    return lower, upper
+
+# distributes total bikes with values as close as possible to center (same shift for
+# all stations) within the given bounds and returns the integer allocation
+def _fill(center, lower, upper, total):
+    low, high = (lower - center).min() - 1.0, (upper - center).max() + 1.0
+    for i in range(100):
+        shift = (low + high) / 2.0
+        if np.clip(center + shift, lower, upper).sum() < total:
+            low = shift
+        else:
+            high = shift
+    values = np.clip(center + high, lower, upper)
+    allocation = np.floor(values).astype(int)
+    remainder = int(round(total - allocation.sum()))
+    if remainder > 0:
+        candidates = np.flatnonzero(allocation < upper)
+        order = candidates[np.argsort(-(values - allocation)[candidates], kind='stable')]
+        allocation[order[:remainder]] += 1
+    return allocation
+
+# returns the optimal integer number of bikes at the beginning of the day for every
+# station. If total is given, the allocations sum up to total: stations are shifted
+# from the centre of their interval by the same amount, as long as this is possible
+# without leaving the intervals, and within [0, capacity] otherwise.
+def optimal_allocation(net_change, capacity, total=None, margin=MARGIN):
+    capacity = np.asarray(capacity, dtype=float)
+    lower, upper = feasible_range(net_change, capacity, margin)
+    lower, upper = np.ceil(lower), np.floor(upper)
+    # (the centre of the unclipped interval, so that clipping an interval that does not
+    # overlap [0, capacity] does not move it)
+    center = np.clip((lower + upper) / 2.0, 0.0, capacity)
+    lower, upper = np.clip(lower, 0, capacity), np.clip(upper, 0, capacity)
+    feasible = lower <= upper
+    compromise = np.floor(center + 0.5)
+    if total is None:
+        return compromise.astype(int)
+    if total < 0 or total > capacity.sum():
+        raise ValueError('total of {0} bikes does not fit into the stations'.format(total))
+    # keep stations with an empty interval at their compromise
+    lower = np.where(feasible, lower, compromise)
+    upper = np.where(feasible, upper, compromise)
+    if lower.sum() <= total <= upper.sum():
+        return _fill(center, lower, upper, total)
+    return _fill(center, np.zeros_like(capacity), capacity, total)
@@ -0,0 +1,177 @@
+# Stages of the extended pipeline (run_simulation.py) and a small engine that runs them.
+#
+# Every stage declares the command it runs, the settings and files it reads (inputs)
+# and the files it writes (outputs). A stage depends on the earlier stages that write
+# one of its inputs or outputs, or that read one of its outputs, so stages that do not
+# depend on each other (e.g. 5-generate_results.py, 6-validate.py and
+# 7-generate_graph.py) run in parallel. The graphs in output_dir are not declared, since
+# each stage writes its own.
+#
+# Stages whose inputs did not change since their last successful run are skipped.
+# The key of a stage is a hash of its code (the script and the bss modules it imports,
+# or the jar), its settings, the contents of the files it reads that no stage writes
+# (e.g. the data) and the keys of the stages that wrote the files it reads. The keys of
+# the last successful runs are stored in .pipeline.json in the working directory; a
+# stage also runs again if one of its outputs is missing.
+#
+# A stage that fails (exits with a non-zero code) stops the pipeline: the other
+# running stages are terminated and no further stages are started.
+
+import json
+import os
+import re
+import subprocess
+import time
+
+from bss import cache
+from bss.template import get_model_dir
+
+# file the keys of the last successful runs are stored in
+STATE_FILE = '.pipeline.json'
+
+# imports of bss modules in a script or module
+BSS_IMPORT = re.compile(r'^\s*from bss(?:\.(\w+))? import ([\w, ]+)', re.MULTILINE)
+
+# location of the bss modules
+BSS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# files of the cleaning phase (see 0-cleanup.py)
+CLEANED_FILES = ['stations.csv', 'records.csv', 'records_validation.csv', 'records.npz', 'records_validation.npz']
+
+# returns a stage with the given title, shell command and inputs and outputs (see the
+# top of this file). code are the files the command runs (scripts or jars).
+def stage(title, command, code, settings=(), inputs=(), outputs=()):
+    return {'title': title, 'command': command, 'code': list(code), 'settings': list(settings),
+            'inputs': [os.path.normpath(path) for path in inputs], 'outputs': [os.path.normpath(path) for path in outputs]}
+
+# returns a stage that runs the given python script
+def script_stage(title, script, settings=(), inputs=(), outputs=()):
+    return stage(title, 'python3 ' + script, [script], settings, inputs, outputs)
+
+# returns the stages of the extended pipeline for the given settings (without the
+# cleaning phase if cleaning is False)
+def extended_stages(settings, cleaning=True):
+    model_dir = get_model_dir(settings)
+    model = [os.path.join(model_dir, name) for name in ['model.carma', 'experiment.exp', 'parameters.npz']]
+    if settings.get('simulator', 'java') == 'python':
+        simulation = script_stage('Simulating', '4-simulate.py',
+                                  ['simulator', 'replications', 'samples', 'simulation_end_time', 'simulation_seed', 'nthreads',
+                                   'trace_format', 'simulation_batch_size', 'tau_step', 'name', 'model_dir'],
+                                  model, ['Traces', 'Results'])
+    else:
+        simulation = stage('Simulating', 'java -Duser.country=UK -Duser.language=en -Dtraces={3} -Xmx7G -jar MyCLI.jar {0} {1} / {2}'.format(
+                               settings['nthreads'], settings['simulation_seed'], os.path.join(model_dir, 'experiment.exp'), settings.get('trace_format', 'csv')),
+                           ['MyCLI.jar'], ['simulator', 'nthreads', 'simulation_seed', 'trace_format', 'name', 'model_dir'], model, ['Traces', 'Results'])
+    if settings.get('sstl_evaluator', 'java') == 'python':
+        evaluation = script_stage('jSSTL Evaluation', '8-evaluate_formulas.py',
+                                  ['sstl_evaluator', 'replications', 'nthreads', 'smc_batch_size', 'smc_confidence', 'smc_indifference',
+                                   'smc_interval', 'smc_threshold', 'smc_width'], ['Traces', 'model.dist'], ['Formulas'])
+    else:
+        evaluation = stage('jSSTL Evaluation', 'java -Duser.country=UK -Duser.language=en -jar jSSTLEvalMulti.jar {0}'.format(settings['replications']),
+                           ['jSSTLEvalMulti.jar'], ['sstl_evaluator', 'replications'], ['Traces', 'model.tra'], ['Formulas'])
+    stages = [
+        script_stage('Cleansing', '0-cleanup.py',
+                     ['historic_data_location', 'stations_data_location', 'duration_min_quantile', 'duration_max_quantile',
+                      'station_usage_threshold', 'split_seed', 'output_dir', 'verbose'],
+                     [settings['historic_data_location'], settings['stations_data_location']], CLEANED_FILES),
+        script_stage('Analysis', '1-analyse.py', ['output_dir'], ['stations.csv', 'records.npz', 'records_validation.npz']),
+        script_stage('Station Optimals Calculation', '2-calc_optimals.py', ['optimals_fixed_fleet', 'simulation_weekdays', 'simulation_end_time'],
+                     ['stations.csv', 'records.npz'], ['stations.csv']),
+        script_stage('Parametrization', '3-parametrize.py',
+                     ['use_truck', 'average_walk_time', 'cooperation', 'incentives', 'incentives_max_distance', 'output_dir',
+                      'refresh_destinations', 'replications', 'samples', 'simulation_end_time', 'use_optimals',
+                      'user_satisfaction_max_distance', 'verbose', 'name', 'model_dir'],
+                     ['model.carma', 'stations.csv', 'records.npz'], model),
+        simulation,
+        script_stage('Output Generation', '5-generate_results.py', ['output_dir'], ['Results', 'stations.csv']),
+        script_stage('Validation', '6-validate.py', ['output_dir', 'samples', 'simulation_end_time', 'verbose'],
+                     ['Results', 'stations.csv', 'records.npz', 'records_validation.npz']),
+        script_stage('jSSTL Graph Generation', '7-generate_graph.py', ['graph_max_distance'], ['stations.csv'], ['model.tra', 'model.dist']),
+        evaluation,
+        script_stage('jSSTL Visualization', '9-visualize_formulas.py', ['output_dir'], ['Formulas', 'stations.csv']),
+    ]
+    return stages if cleaning else stages[3:]
+
+# returns the bss modules the python file at path imports (also indirectly)
+def _bss_modules(path, modules=None):
+    modules = set() if modules is None else modules
+    with open(path, 'r') as file:
+        source = file.read()
+    for module, names in BSS_IMPORT.findall(source):
+        for name in [module] if module else [name.strip() for name in names.split(',')]:
+            module_path = os.path.join(BSS_DIR, name + '.py')
+            if name not in modules and os.path.exists(module_path):
+                modules.add(name)
+                _bss_modules(module_path, modules)
+    return modules
+
+# returns the hash of the file or directory at path (None if it does not exist). The
+# files of a directory are identified by their names, sizes and modification times.
+def _hash_path(path):
+    if os.path.isdir(path):
+        return cache.make_key(sorted((name, os.path.getsize(os.path.join(path, name)), os.path.getmtime(os.path.join(path, name)))
+                                     for name in os.listdir(path)))
+    return cache.file_hash(path) if os.path.exists(path) else None
+
+# returns the indices of the earlier stages each stage depends on and of the last
+# earlier stage that wrote each of its inputs
+def _dependencies(stages):
+    dependencies, writers = [], []
+    for i, current in enumerate(stages):
+        reads, writes = set(current['inputs']), set(current['outputs'])
+        dependencies.append({j for j in range(i) if set(stages[j]['outputs']) & (reads | writes) or set(stages[j]['inputs']) & writes})
+        writers.append({path: max([j for j in range(i) if path in stages[j]['outputs']], default=None) for path in current['inputs']})
+    return dependencies, writers
+
+# returns the key of the stage (see the top of this file), given the keys of the stages
+# that wrote its inputs
+def _key(current, settings, writer_keys):
+    code = []
+    for path in current['code']:
+        code.append((path, _hash_path(path)))
+        if path.endswith('.py'):
+            code += [(name, _hash_path(os.path.join(BSS_DIR, name + '.py'))) for name in sorted(_bss_modules(path))]
+    inputs = [(path, writer_keys[path] if path in writer_keys else _hash_path(path)) for path in current['inputs']]
+    return cache.make_key(current['command'], code, dict((key, settings.get(key)) for key in current['settings']), inputs)
+
+# runs the stages in the working directory, skipping those whose key did not change
+# (unless force is True) and running independent stages in parallel. Returns 0 if all
+# stages succeeded and the exit code of the first stage that failed otherwise.
+def run_pipeline(stages, settings, force=False, poll=0.5):
+    state = {}
+    if os.path.exists(STATE_FILE) and not force:
+        with open(STATE_FILE, 'r') as file:
+            state = json.load(file)
+    dependencies, writers = _dependencies(stages)
+    keys, running, done = {}, {}, set()
+    while len(done) < len(stages):
+        for i, current in enumerate(stages):
+            if i in running or i in done or not dependencies[i] <= done:
+                continue
+            name = '{0}/{1} {2}'.format(i + 1, len(stages), current['title'])
+            keys[i] = _key(current, settings, {path: keys[j] for path, j in writers[i].items() if j is not None})
+            if state.get(current['title']) == keys[i] and all(os.path.exists(path) for path in current['outputs']):
+                print('{0}: inputs unchanged, skipping'.format(name), flush=True)
+                done.add(i)
+                continue
+            # (a stage that does not finish must not be skipped next time)
+            state.pop(current['title'], None)
+            cache.write_json(os.path.abspath(STATE_FILE), state)
+            print('-' * 10 + '\n\n{0}\n\n'.format(name) + '-' * 10 + '\n', flush=True)
+            running[i] = subprocess.Popen(current['command'], shell=True)
+        time.sleep(poll)
+        for i, process in list(running.items()):
+            if process.poll() is None:
+                continue
+            del running[i]
+            if process.returncode != 0:
+                print('{0} failed with exit code {1}, stopping.'.format(stages[i]['title'], process.returncode), flush=True)
+                for other in running.values():
+                    other.terminate()
+                for other in running.values():
+                    other.wait()
+                return process.returncode
+            done.add(i)
+            state[stages[i]['title']] = keys[i]
+            cache.write_json(os.path.abspath(STATE_FILE), state)
+    return 0
@@ -0,0 +1,182 @@
+# Concurrent execution of the experiments of a plan (plan.json).
+#
+# Every experiment runs in its own working directory (Planned_Experiments/<name>/work)
+# with a copy of the pipeline (scripts, model template and jars) and its own
+# settings.json, so the experiments do not share settings.json, model.carma, Models/,
+# Traces/, Results/ or Formulas/ and can run at the same time. The paths in the
+# settings are made absolute and the scripts find bss through PYTHONPATH.
+#
+# An experiment that omits the cleaning phase (needs_cleaning false) uses the cleaned
+# data of the last experiment before it in the plan that cleans the data (or of the
+# pipeline directory, if there is none). So that it does not have to wait for the
+# whole experiment, an experiment that cleans the data runs as two jobs: the cleaning
+# phase (0-cleanup.py to 2-calc_optimals.py) and the rest of the pipeline.
+#
+# The jobs are started in the order of the plan as soon as the jobs they depend on
+# have finished and they fit into the budget of cores and memory. An experiment takes
+# nthreads cores and the memory of its largest stage (see experiment_memory), a job
+# that is larger than the whole budget runs alone. The formulas and results of an
+# experiment are collected in its output folder when it finishes (an experiment without
+# formulas or results fails), and its working directory is removed at the end of the
+# plan (unless the experiment failed).
+
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from bss.simulation import BATCH_SIZE
+
+# root of the repository (contains bss/ and data/)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# stages of the cleaning phase, which run_simulation_no_cleaning.py omits (run one
+# after another until one fails, like run_simulation.py does)
+CLEANING_STAGES = ['0-cleanup.py', '1-analyse.py', '2-calc_optimals.py']
+
+# files of the cleaning phase that the following stages read
+CLEANED_FILES = ['stations.csv', 'records.csv', 'records_validation.csv', 'records.npz', 'records_validation.npz']
+
+# settings that are paths relative to the pipeline directory
+PATH_SETTINGS = ['historic_data_location', 'stations_data_location', 'output_dir']
+
+# memory (in GB) of a stage that runs a jar: the heap of MyCLI.jar (-Xmx7G) and the JVM
+JVM_MEMORY = 8.0
+
+# memory (in GB) of the python stages, and of the samples 4-simulate.py keeps per
+# replication of a batch
+PYTHON_MEMORY = 1.0
+REPLICATION_MEMORY = 0.0015
+
+# returns the memory (in GB) an experiment with the given settings needs at most, or
+# memory_gb if it is given in the settings
+def experiment_memory(settings):
+    if 'memory_gb' in settings:
+        return float(settings['memory_gb'])
+    memory = PYTHON_MEMORY
+    if settings.get('simulator', 'java') == 'java' or settings.get('sstl_evaluator', 'java') == 'java':
+        memory = max(memory, JVM_MEMORY)
+    if settings.get('simulator', 'java') == 'python':
+        batch_size = settings.get('simulation_batch_size') or BATCH_SIZE
+        memory = max(memory, PYTHON_MEMORY + REPLICATION_MEMORY * min(settings['replications'], settings['nthreads'] * batch_size))
+    return memory
+
+# returns the physical memory of the machine in GB
+def physical_memory():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / float(1 << 30)
+
+# creates the working directory of an experiment with the given settings, with a copy
+# of the pipeline in source and the cleaned data in cleaned (if given)
+def prepare_workdir(settings, source, workdir, cleaned=None):
+    os.makedirs(os.path.join(workdir, 'results_graphs', 'validation'), exist_ok=True)
+    # (the simulator and evaluator write into these, but do not create them)
+    for name in ['Traces', 'Results', 'Formulas']:
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+    for name in os.listdir(source):
+        if name.endswith('.py') or name.endswith('.jar') or name == 'model.carma':
+            shutil.copy2(os.path.join(source, name), workdir)
+    if cleaned is not None:
+        for name in CLEANED_FILES:
+            if os.path.exists(os.path.join(cleaned, name)):
+                shutil.copy2(os.path.join(cleaned, name), workdir)
+    settings = dict(settings)
+    for key in PATH_SETTINGS:
+        if key in settings:
+            settings[key] = os.path.abspath(os.path.join(source, settings[key]))
+    with open(os.path.join(workdir, 'settings.json'), 'w') as file:
+        file.write(json.dumps(settings, indent=4))
+
+# copies the formulas and results of the working directory to the output folder and
+# removes the trajectories. Returns False (and keeps the trajectories) if the formulas
+# or results are missing.
+def collect_outputs(workdir, output_folder):
+    missing = [name for name in ['Formulas', 'Results'] if not os.listdir(os.path.join(workdir, name))]
+    if missing:
+        print('warning: experiment in "{0}" produced no {1}'.format(workdir, ' or '.join(name.lower() for name in missing)))
+        return False
+    for name in ['Formulas', 'Results']:
+        shutil.rmtree(os.path.join(output_folder, name), ignore_errors=True)
+        shutil.copytree(os.path.join(workdir, name), os.path.join(output_folder, name))
+    shutil.rmtree(os.path.join(workdir, 'Traces'), ignore_errors=True)
+    return True
+
+# returns the jobs for the experiments of the plan. Every job is a dict with the
+# experiment (name), the shell command to run in the working directory, the jobs it
+# has to wait for (after), its cores and memory and the functions to call before it
+# starts (prepare) and after it finished successfully (finish, the job fails if it
+# returns False).
+def plan_jobs(plan, source='.'):
+    jobs = []
+    # job and working directory of the last cleaning phase
+    cleaning, cleaned = None, source
+    for exp in plan:
+        output_folder = os.path.join(source, 'Planned_Experiments', exp['name'])
+        workdir = os.path.join(output_folder, 'work')
+        cores, memory = exp['nthreads'], experiment_memory(exp)
+        run = {'name': exp['name'], 'command': 'python3 run_simulation_no_cleaning.py', 'workdir': workdir,
+               'log': os.path.join(output_folder, 'out.txt'), 'cores': cores, 'memory': memory,
+               'finish': lambda workdir=workdir, output_folder=output_folder: collect_outputs(workdir, output_folder)}
+        prepare = lambda exp=exp, workdir=workdir, cleaned=cleaned: prepare_workdir(exp, source, workdir, cleaned)
+        if exp['needs_cleaning']:
+            cleaning, cleaned = len(jobs), workdir
+            jobs.append({'name': exp['name'], 'command': ' && '.join('python3 ' + stage for stage in CLEANING_STAGES),
+                         'workdir': workdir, 'log': run['log'], 'cores': 1, 'memory': PYTHON_MEMORY,
+                         'after': [], 'prepare': lambda exp=exp, workdir=workdir: prepare_workdir(exp, source, workdir), 'finish': None})
+            run.update({'after': [len(jobs) - 1], 'prepare': None})
+        else:
+            run.update({'after': [] if cleaning is None else [cleaning], 'prepare': prepare})
+        jobs.append(run)
+    return jobs
+
+# runs the jobs (see plan_jobs) with at most the given cores and memory (in GB, by
+# default all of the machine) in use at once and returns the exit code of each job
+# (None for jobs that were skipped because a job they depend on failed)
+def run_jobs(jobs, cores=None, memory=None, poll=1.0):
+    cores = cores or os.cpu_count()
+    memory = memory or physical_memory()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + [p for p in [os.environ.get('PYTHONPATH')] if p]), PYTHONUNBUFFERED='1')
+    running, codes = {}, {}
+    while len(codes) < len(jobs):
+        for i, job in enumerate(jobs):
+            if i in running or i in codes or any(j not in codes for j in job['after']):
+                continue
+            if any(codes[j] != 0 for j in job['after']):
+                print('skipping experiment "{0}", because a job it depends on failed'.format(job['name']))
+                codes[i] = None
+                continue
+            used_cores = sum(jobs[j]['cores'] for j in running)
+            used_memory = sum(jobs[j]['memory'] for j in running)
+            if running and (used_cores + job['cores'] > cores or used_memory + job['memory'] > memory):
+                continue
+            if job['prepare'] is not None:
+                job['prepare']()
+            print('starting experiment "{0}" ({1}), outputting to "{2}"'.format(job['name'], job['command'], job['log']))
+            # (the jobs of an experiment write to the same log, which is new for the first)
+            log = open(job['log'], 'a' if any(jobs[j]['log'] == job['log'] for j in codes) else 'w')
+            running[i] = (subprocess.Popen(job['command'], shell=True, cwd=job['workdir'], env=env, stdout=log, stderr=subprocess.STDOUT), log)
+        time.sleep(poll)
+        for i, (process, log) in list(running.items()):
+            if process.poll() is None:
+                continue
+            log.close()
+            del running[i]
+            codes[i] = process.returncode
+            if codes[i] == 0 and jobs[i]['finish'] is not None and jobs[i]['finish']() is False:
+                codes[i] = 1
+            print('finished experiment "{0}" ({1}) with exit code {2}.'.format(jobs[i]['name'], jobs[i]['command'], codes[i]))
+    return [codes[i] for i in range(len(jobs))]
+
+# runs the experiments of the plan (see plan_jobs and run_jobs), removes the working
+# directories of the experiments that succeeded and returns the names of those that did not
+def run_plan(plan, source='.', cores=None, memory=None):
+    jobs = plan_jobs(plan, source)
+    codes = run_jobs(jobs, cores, memory)
+    failed = []
+    for job, code in zip(jobs, codes):
+        if code != 0 and job['name'] not in failed:
+            failed.append(job['name'])
+    for job in jobs:
+        if job['name'] not in failed:
+            shutil.rmtree(job['workdir'], ignore_errors=True)
+    return failed
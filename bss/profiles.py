@@ -0,0 +1,77 @@
+# Average hourly demand profiles of all stations.
+#
+# For every station and hour of the day, the average number of departures and
+# arrivals on the days in the records is computed in a single pass over the
+# integer station ids. The availability of a station over the day then is its
+# initial number of bikes plus the cumulative sum of its net change
+# (arrivals - departures), which makes it cheap to evaluate for many initial values.
+
+import os
+import numpy as np
+import pandas as pd
+
+from bss import cache
+from bss.records import read_records
+
+# returns the hours (with date) that are considered when averaging: all hours between
+# the first and the last departure on days that have at least one departure
+def observed_hours(started_at):
+    hours = pd.date_range(started_at.min().floor('60min'), started_at.max().floor('60min'), freq='60min')
+    return hours[hours.normalize().isin(started_at.normalize().unique())]
+
+# returns two arrays of shape (n_stations, 24) with the average number of departures
+# and arrivals for each station and hour of the day. records needs the index started_at
+# and the columns ended_at, start_station_id and end_station_id. Only arrivals on the
+# same day as the departure are counted. If by_weekday is true, the arrays have the
+# shape (7, n_stations, 24) and hold the averages for each weekday (monday first)
+# separately. Weekdays that do not occur in the records are nan.
+def hourly_profiles(records, n_stations, by_weekday=False):
+    started_at = pd.DatetimeIndex(records.index)
+    ended_at = pd.DatetimeIndex(records['ended_at'])
+    start_ids = records['start_station_id'].values
+    end_ids = records['end_station_id'].values
+    hours = observed_hours(started_at)
+    n_groups = 7 if by_weekday else 1
+    group_of = (lambda times: times.weekday.values) if by_weekday else (lambda times: np.zeros(len(times), dtype=int))
+    days_per_hour = np.bincount(group_of(hours) * 24 + hours.hour, minlength=n_groups * 24).reshape(n_groups, 1, 24)
+
+    departing = start_ids >= 0
+    departures = np.bincount(
+        (group_of(started_at)[departing] * n_stations + start_ids[departing]) * 24 + started_at.hour[departing],
+        minlength=n_groups * n_stations * 24)
+
+    arriving = (end_ids >= 0) \
+        & (ended_at.normalize() == started_at.normalize()) \
+        & ended_at.floor('60min').isin(hours)
+    arrivals = np.bincount(
+        (group_of(ended_at)[arriving] * n_stations + end_ids[arriving]) * 24 + ended_at.hour[arriving],
+        minlength=n_groups * n_stations * 24)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        departures = departures.reshape(n_groups, n_stations, 24) / days_per_hour
+        arrivals = arrivals.reshape(n_groups, n_stations, 24) / days_per_hour
+    if not by_weekday:
+        return departures[0], arrivals[0]
+    return departures, arrivals
+
+# same as hourly_profiles, but reads the records from the archive at path and caches the
+# results by the contents of the archive
+def load_hourly_profiles(path, n_stations, by_weekday=False):
+    key = cache.make_key(cache.file_hash(path), n_stations, by_weekday)
+    directory = cache.lookup('profiles', key)
+    if directory is None:
+        def write(directory):
+            records = read_records(path, columns=['ended_at', 'start_station_id', 'end_station_id'])
+            departures, arrivals = hourly_profiles(records, n_stations, by_weekday)
+            np.save(os.path.join(directory, 'departures.npy'), departures)
+            np.save(os.path.join(directory, 'arrivals.npy'), arrivals)
+        directory = cache.store('profiles', key, write)
+    return np.load(os.path.join(directory, 'departures.npy')), np.load(os.path.join(directory, 'arrivals.npy'))
+
+# returns the number of available bikes at the end of each hour of the day for the
+# given initial number of bikes and net change (arrivals - departures) per hour.
+# Both may be arrays over stations, the hours are the last axis of net_change.
+def availability(initial, net_change):
+    initial = np.asarray(initial, dtype=float)
+    levels = np.concatenate([initial[..., np.newaxis], net_change], axis=-1)
+    return np.cumsum(levels, axis=-1)[..., 1:]
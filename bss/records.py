@@ -0,0 +1,67 @@
+# Typed columnar storage for the cleaned trip records.
+#
+# The cleansing stage writes the records as `.npz` archive next to the csv export.
+# Every column is stored as its own numpy array: the timestamps as datetime64,
+# the station names as int32 codes into a shared, sorted list of names and
+# additionally the int32 station ids (row in `stations.csv`, -1 if the station
+# is not in the list). Because the archive is read lazily, loading only a few
+# columns does not touch the others and no dates have to be parsed.
+
+import json
+import numpy as np
+import pandas as pd
+
+# columns holding station names, stored as categoricals
+NAME_COLUMNS = ['start_station_name', 'end_station_name']
+
+# columns holding station ids, derived from the name columns
+ID_COLUMNS = ['start_station_id', 'end_station_id']
+
+# converts a (possibly timezone aware) datetime series to naive utc values and its timezone
+def _to_utc_values(series):
+    tz = series.dt.tz
+    if tz is not None:
+        series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+    return series.values.astype('datetime64[ns]'), None if tz is None else str(tz)
+
+# writes the records in dataframe to path. stations is the list of station names in the
+# order of `stations.csv`, which defines the station ids.
+def write_records(dataframe, path, stations):
+    data = dataframe.reset_index()
+    index = data.columns[0]
+    names = np.array(sorted(set(data['start_station_name']).union(data['end_station_name'])), dtype=str)
+    sids = pd.Series(np.arange(len(stations), dtype=np.int32), index=pd.Index(stations))
+    arrays = {}
+    meta = {'index': index, 'columns': list(dataframe.columns), 'tz': {}}
+    for column in data.columns:
+        if column in NAME_COLUMNS:
+            arrays[column] = np.searchsorted(names, data[column].values.astype(str)).astype(np.int32)
+        elif pd.api.types.is_datetime64_any_dtype(data[column]):
+            arrays[column], meta['tz'][column] = _to_utc_values(data[column])
+        else:
+            arrays[column] = data[column].values
+    for name_column, id_column in zip(NAME_COLUMNS, ID_COLUMNS):
+        arrays[id_column] = data[name_column].map(sids).fillna(-1).values.astype(np.int32)
+    arrays['station_names'] = names
+    arrays['meta'] = np.array(json.dumps(meta))
+    np.savez(path, **arrays)
+
+# reads the records from path. Only the columns in columns and the index column are
+# loaded. If columns is None, the columns of the written dataframe are loaded (without
+# the station ids, which can be requested explicitly).
+def read_records(path, columns=None, index='started_at'):
+    with np.load(path) as archive:
+        meta = json.loads(str(archive['meta']))
+        if columns is None:
+            columns = [c for c in [meta['index']] + meta['columns'] if c != index]
+        names = archive['station_names'] if any(c in NAME_COLUMNS for c in columns + [index]) else None
+        data = {}
+        for column in [index] + list(columns):
+            values = archive[column]
+            if column in NAME_COLUMNS:
+                values = pd.Categorical.from_codes(values, categories=names)
+            elif meta['tz'].get(column) is not None:
+                values = pd.to_datetime(values, utc=True).tz_convert(meta['tz'][column])
+            data[column] = values
+    dataframe = pd.DataFrame({c: data[c] for c in columns}, index=pd.Index(data[index], name=index))
+    return dataframe
@@ -0,0 +1,576 @@
+# Simulation of the extended model (model.carma) with numpy instead of CARMA.
+#
+# The parameters of the model (capacities, initial bikes, goals, spawn rates,
+# destination probabilities, trip durations and the adjacency of the stations) are
+# read from the archive that 3-parametrize.py writes next to the parametrized model.
+# A batch of replications is simulated in lock-step: the state of all replications is
+# kept in arrays with one row per replication (available bikes, expected returns,
+# counters and the users that are walking or riding), and every step processes the
+# next event of each replication at once. Events are
+#
+# - the spawn of a user (Spawner): the spawns of all stations form a Poisson process
+#   with the rate demand[sid][hour] summed over the stations, the station is chosen
+#   proportionally to its rate and the destination with dest(sid, hour),
+# - the arrival of a walking user at a station (rate walk_time) and
+# - the arrival of a biking user at the destination (rate 1 / dur[sid][dest_sid], or
+#   1 / (0.5 * walk_time) when riding on to another station).
+#
+# The retrieval and return of bikes at a station have a rate of 400 per minute in the
+# model, so they happen immediately when a user arrives. If there is no bike (slot),
+# the user walks (rides) to a random station of zone_adjacency_2 that was not visited
+# yet and gives up after the third failure, counting the failures for the
+# dissatisfaction levels. The incentive strategies and user cooperation follow
+# orig_incentivized and dest_incentivized, and the truck (rate 500) resets all
+# stations to their goal after every event in the redistribution windows.
+#
+# The measures of the experiment are sampled at the same times as by MyCLI.jar: the
+# state does not change between two events, so all samples before the next event of a
+# replication are filled at once, as a slice of its sample axis. The results
+# (Results/<measure>.csv with the columns time, mean, stddev and stderr) and
+# trajectories (Traces/, see bss/traces.py) are written in the same formats. The
+# replications are simulated in batches of a fixed size (BATCH_SIZE by default) on a
+# pool of processes, each batch with a generator seeded by the seed and its first
+# replication, so for a given batch size the results do not depend on the number of
+# processes.
+#
+# TauLeaping approximates the replications in fixed time steps instead of event by
+# event, which is faster for screening many configurations.
+
+import itertools
+import multiprocessing
+import os
+import numpy as np
+
+from bss.destinations import destination_tensor
+from bss.traces import write_trace, write_trace_csv
+
+# times (in whole minutes, inclusive) in which the truck redistributes the bikes (see
+# the TRUCK section in 3-parametrize.py)
+TRUCK_WINDOWS = [(1380, 1439), (2810, 2879), (4240, 4319)]
+
+# number of hours in the table of the expected returns (will_return in the model)
+RETURN_HOURS = 74
+
+# measures that are counted for each replication, in the order of the columns of the
+# sampled counters
+COUNTERS = ['Retrievals', 'IncRetrievals', 'Returns', 'IncReturns', 'GlobalUsers', 'Biking', 'Waiting', 'Returning'] \
+    + ['DissatisfiedGet[level={0}]'.format(level) for level in range(4)] \
+    + ['DissatisfiedRet[level={0}]'.format(level) for level in range(4)]
+RETRIEVALS, INC_RETRIEVALS, RETURNS, INC_RETURNS, USERS, BIKING, WAITING = range(7)
+DISSATISFIED_GET = COUNTERS.index('DissatisfiedGet[level=0]')
+DISSATISFIED_RET = COUNTERS.index('DissatisfiedRet[level=0]')
+
+# number of replications that are simulated at once by default (see simulate)
+BATCH_SIZE = 100
+
+# states of the users
+WALK = 0
+BIKE = 1
+
+# returns the lists as array with one row per list, padded with -1
+def padded_lists(lists):
+    width = max((len(values) for values in lists), default=0)
+    padded = np.full((len(lists), width), -1, dtype=np.int64)
+    for i, values in enumerate(lists):
+        padded[i, :len(values)] = values
+    return padded
+
+# writes the parameters of the model (arrays and scalars, see 3-parametrize.py) to path
+def write_parameters(path, **parameters):
+    np.savez(path, **parameters)
+
+# returns the parameters written by write_parameters
+def read_parameters(path):
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+# returns the index of the entry of each row of cumulative (cumulative probabilities)
+# that is chosen by the uniform random number u of the row
+def _choose(cumulative, u):
+    return np.minimum((cumulative <= u[:, np.newaxis]).sum(axis=1), cumulative.shape[1] - 1)
+
+# the state of a batch of replications, which are simulated in lock-step
+class Simulation:
+
+    def __init__(self, parameters, replications, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.capacity = parameters['capacity'].astype(np.int64)
+        self.goal_days = parameters['goal_days'].astype(np.int64)
+        self.demand = parameters['demand']
+        self.dur = parameters['dur']
+        self.adjacency = parameters['adjacency']
+        self.adjacency2 = parameters['adjacency2']
+        self.walk_time = float(parameters['walk_time'])
+        self.cooperation = float(parameters['cooperation'])
+        self.use_truck = bool(parameters['use_truck'])
+        self.incentives = str(parameters['incentives'])
+        n_stations = len(self.capacity)
+
+        # total spawn rate and cumulative probabilities of the spawning station per hour
+        self.spawn_rate = self.demand.sum(axis=0)
+        self.spawn_cumulative = np.cumsum(self.demand.T, axis=1) / np.where(self.spawn_rate > 0, self.spawn_rate, 1.0)[:, np.newaxis]
+        # cumulative probabilities of the destinations [hour, start] (selectFrom
+        # normalizes the probabilities) and whether there is a destination at all
+        destinations = destination_tensor(parameters['dest_hours'], parameters['dest_starts'], parameters['dest_ends'],
+                                          parameters['dest_probabilities'], n_stations)
+        totals = destinations.sum(axis=2)
+        self.has_destination = totals > 0
+        self.dest_cumulative = np.cumsum(destinations, axis=2) / np.where(self.has_destination, totals, 1.0)[..., np.newaxis]
+
+        self.rows = np.arange(replications)
+        self.bikes = np.tile(parameters['available'].astype(np.int64), (replications, 1))
+        self.will_return = np.zeros((replications, RETURN_HOURS, n_stations), dtype=np.int64)
+        self.counters = np.zeros((replications, len(COUNTERS)), dtype=np.int64)
+        # users that walk or ride (time of their next event, inf for free slots), with
+        # the station they walk or ride to, the stations they were created with (origin
+        # and destination) and their number of failures
+        self.user_time = np.full((replications, 16), np.inf)
+        self.user_state = np.zeros((replications, 16), dtype=np.int8)
+        self.user_station = np.zeros((replications, 16), dtype=np.int64)
+        self.user_origin = np.zeros((replications, 16), dtype=np.int64)
+        self.user_destination = np.zeros((replications, 16), dtype=np.int64)
+        self.user_fails = np.zeros((replications, 16), dtype=np.int64)
+        self.next_spawn, self.spawning = self._next_spawn(np.zeros(replications))
+
+    # returns the time of the next spawn after the given times and whether it is a
+    # spawn. The rates change every hour, so if there is no spawn until the end of the
+    # hour, the end of the hour is returned instead, from where the next one is drawn.
+    def _next_spawn(self, times):
+        hours = np.floor(times / 60.0)
+        rates = self.spawn_rate[hours.astype(np.int64) % 24]
+        with np.errstate(divide='ignore'):
+            spawns = times + self.rng.exponential(size=len(times)) / rates
+        spawning = spawns < (hours + 1) * 60.0
+        return np.where(spawning, spawns, (hours + 1) * 60.0), spawning
+
+    # returns a free slot for a new user in each of the rows (different slots for rows
+    # that occur more than once), with more slots if needed
+    def _free_slots(self, rows):
+        needed = np.bincount(rows, minlength=len(self.rows))
+        while (needed > np.isinf(self.user_time).sum(axis=1)).any():
+            self.user_time = np.concatenate([self.user_time, np.full_like(self.user_time, np.inf)], axis=1)
+            for name in ['user_state', 'user_station', 'user_origin', 'user_destination', 'user_fails']:
+                values = getattr(self, name)
+                setattr(self, name, np.concatenate([values, np.zeros_like(values)], axis=1))
+        order = np.argsort(rows, kind='stable')
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - np.searchsorted(rows[order], rows[order])
+        free = np.argsort(~np.isinf(self.user_time[rows]), axis=1, kind='stable')
+        return free[np.arange(len(rows)), rank]
+
+    # returns a random station of zone_adjacency_2 of each station, excluding the
+    # visited stations, or the station itself if there is none (choose_random_alternate_dest)
+    def _alternative(self, stations, visited, other):
+        others = self.adjacency2[stations]
+        valid = (others >= 0) & (others != visited[:, np.newaxis]) & (others != other[:, np.newaxis])
+        count = valid.sum(axis=1)
+        if others.shape[1] == 0:
+            return stations
+        pick = np.floor(self.rng.random(len(stations)) * count)
+        index = np.argmax(valid & (np.cumsum(valid, axis=1) == pick[:, np.newaxis] + 1), axis=1)
+        return np.where(count > 0, others[np.arange(len(stations)), index], stations)
+
+    # returns pred of the model: the expected number of bikes at the stations (shape
+    # (rows, candidates)) at the end of the day of the given hours minus their goal
+    def _pred(self, rows, stations, hours):
+        offsets = np.arange(24)
+        times = hours[..., np.newaxis] + offsets
+        valid = times < (-(-hours // 24) * 24)[..., np.newaxis]
+        departures = self.demand[stations[..., np.newaxis], times % 24] * 60.0 * 0.75 ** offsets
+        returns = self.will_return[rows[:, np.newaxis, np.newaxis], times % RETURN_HOURS, stations[..., np.newaxis]]
+        future = self.bikes[rows[:, np.newaxis], stations] + np.where(valid, returns - departures, 0.0).sum(axis=-1)
+        return future - self.goal_days[np.minimum(hours // 24 + 1, len(self.goal_days) - 1), stations]
+
+    # returns whether each of the users cooperates (user_cooperation)
+    def _cooperates(self, n):
+        return self.rng.random(n) < self.cooperation
+
+    # returns the origins chosen by orig_incentivized for the users spawned at the
+    # stations at the given times
+    def _incentivized_origin(self, rows, stations, times):
+        if self.adjacency.shape[1] == 0:
+            return stations
+        hours = np.floor(times / 60.0).astype(np.int64)[:, np.newaxis]
+        p = self._pred(rows, stations[:, np.newaxis], hours)[:, 0]
+        candidates = self.adjacency[stations]
+        valid = candidates >= 0
+        candidates = np.where(valid, candidates, 0)
+        predictions = self._pred(rows, candidates, np.broadcast_to(hours, candidates.shape))
+        eligible = valid & (self.bikes[rows[:, np.newaxis], candidates] > 3) & (p < 0)[:, np.newaxis]
+        predictions = np.where(eligible, predictions, -np.inf)
+        best = np.argmax(predictions, axis=1)
+        index = np.arange(len(rows))
+        moved = (predictions[index, best] > p) & self._cooperates(len(rows))
+        np.add.at(self.counters, (rows[moved], INC_RETRIEVALS), 1)
+        return np.where(moved, candidates[index, best], stations)
+
+    # returns the destinations chosen by dest_incentivized for the users spawned at the
+    # stations at the given times with the given destinations
+    def _incentivized_destination(self, rows, stations, destinations, times):
+        if self.adjacency.shape[1] == 0:
+            return destinations
+        arrivals = np.floor((times + self.dur[stations, destinations]) / 60.0).astype(np.int64)
+        p = self._pred(rows, destinations[:, np.newaxis], arrivals[:, np.newaxis])[:, 0]
+        candidates = self.adjacency[destinations]
+        valid = candidates >= 0
+        candidates = np.where(valid, candidates, 0)
+        arrivals = np.floor((times[:, np.newaxis] + self.dur[stations[:, np.newaxis], candidates]) / 60.0).astype(np.int64)
+        predictions = self._pred(rows, candidates, arrivals)
+        eligible = valid & (self.bikes[rows[:, np.newaxis], candidates] < self.capacity[candidates] - 3) & (p > 0)[:, np.newaxis]
+        predictions = np.where(eligible, predictions, np.inf)
+        best = np.argmin(predictions, axis=1)
+        index = np.arange(len(rows))
+        moved = (predictions[index, best] < p) & self._cooperates(len(rows))
+        np.add.at(self.counters, (rows[moved], INC_RETURNS), 1)
+        return np.where(moved, candidates[index, best], destinations)
+
+    # spawns a user at a station in each of the rows (chosen by the spawn rates if not
+    # given) and returns the rows, slots and times of the new users
+    def _spawn(self, rows, times, stations=None):
+        hours = np.floor(times / 60.0).astype(np.int64) % 24
+        if stations is None:
+            stations = _choose(self.spawn_cumulative[hours], self.rng.random(len(rows)))
+        # (dest returns -1 for stations without destinations, which the model cannot
+        # simulate, so these users are not spawned)
+        known = self.has_destination[hours, stations]
+        rows, times, hours, stations = rows[known], times[known], hours[known], stations[known]
+        np.add.at(self.counters, (rows, USERS), 1)
+        np.add.at(self.counters, (rows, RETRIEVALS), 1)
+        destinations = _choose(self.dest_cumulative[hours, stations], self.rng.random(len(rows)))
+        origins = stations
+        if self.incentives in ('get', 'both'):
+            origins = self._incentivized_origin(rows, stations, times)
+        if self.incentives in ('ret', 'both'):
+            destinations = self._incentivized_destination(rows, stations, destinations, times)
+        slots = self._free_slots(rows)
+        self.user_station[rows, slots] = origins
+        self.user_origin[rows, slots] = origins
+        self.user_destination[rows, slots] = destinations
+        self.user_fails[rows, slots] = 0
+        return rows, slots, times
+
+    # lets the users in the slots ride to their destination (station) in the given time
+    def _ride(self, rows, slots, times, destinations, durations):
+        self.user_state[rows, slots] = BIKE
+        self.user_station[rows, slots] = destinations
+        self.user_fails[rows, slots] = 0
+        self.user_time[rows, slots] = times + self.rng.exponential(durations)
+
+    # lets the users in the slots retrieve a bike at their station. Whether they succeed
+    # follows from the available bikes, unless it is given.
+    def _get(self, rows, slots, times, success=None):
+        stations = self.user_station[rows, slots]
+        fails = self.user_fails[rows, slots]
+        if success is None:
+            success = self.bikes[rows, stations] > 0
+        # ride to the destination
+        r, s, t = rows[success], slots[success], times[success]
+        destinations = self.user_destination[r, s]
+        durations = self.dur[self.user_origin[r, s], destinations]
+        np.add.at(self.bikes, (r, stations[success]), -1)
+        np.add.at(self.counters, (r, DISSATISFIED_GET + fails[success]), 1)
+        np.add.at(self.counters, (r, BIKING), 1)
+        np.add.at(self.will_return, (r, np.floor((t + durations) / 60.0).astype(np.int64) % RETURN_HOURS, destinations), 1)
+        self._ride(r, s, t, destinations, durations)
+        # walk to another station or give up after the third failure
+        failed = ~success
+        gave_up = failed & (fails == 2)
+        np.add.at(self.counters, (rows[gave_up], DISSATISFIED_GET + 3), 1)
+        self.user_time[rows[gave_up], slots[gave_up]] = np.inf
+        walk = failed & ~gave_up
+        r, s, t = rows[walk], slots[walk], times[walk]
+        np.add.at(self.counters, (r, WAITING), 1)
+        self.user_station[r, s] = self._alternative(stations[walk], self.user_origin[r, s], stations[walk])
+        self.user_fails[r, s] += 1
+        self.user_state[r, s] = WALK
+        self.user_time[r, s] = t + self.rng.exponential(1.0 / self.walk_time, size=len(r))
+
+    # lets the users in the slots return their bike at their station. Whether they
+    # succeed follows from the free slots, unless it is given.
+    def _return(self, rows, slots, times, success=None):
+        stations = self.user_station[rows, slots]
+        fails = self.user_fails[rows, slots]
+        if success is None:
+            success = self.bikes[rows, stations] < self.capacity[stations]
+        r, t = rows[success], times[success]
+        np.add.at(self.bikes, (r, stations[success]), 1)
+        np.add.at(self.counters, (r, USERS), -1)
+        np.add.at(self.counters, (r, RETURNS), 1)
+        np.add.at(self.counters, (r, DISSATISFIED_RET + fails[success]), 1)
+        np.add.at(self.will_return, (r, np.floor(t / 60.0).astype(np.int64) % RETURN_HOURS, stations[success]), -1)
+        self.user_time[r, slots[success]] = np.inf
+        # ride to another station or give up (keeping the bike) after the third failure
+        failed = ~success
+        gave_up = failed & (fails == 2)
+        np.add.at(self.counters, (rows[gave_up], DISSATISFIED_RET + 3), 1)
+        self.user_time[rows[gave_up], slots[gave_up]] = np.inf
+        ride = failed & ~gave_up
+        r, s, t = rows[ride], slots[ride], times[ride]
+        np.add.at(self.counters, (r, BIKING), 1)
+        self.user_station[r, s] = self._alternative(stations[ride], self.user_destination[r, s], stations[ride])
+        self.user_fails[r, s] += 1
+        self.user_time[r, s] = t + self.rng.exponential(0.5 * self.walk_time, size=len(r))
+
+    # sets the stations of the rows to their goal if the times are in a redistribution window
+    def _redistribute(self, rows, times):
+        minutes = np.floor(times)
+        window = np.zeros(len(rows), dtype=bool)
+        for start, end in TRUCK_WINDOWS:
+            window |= (minutes >= start) & (minutes <= end)
+        days = np.minimum(np.floor(times[window] / 1440.0).astype(np.int64) + 1, len(self.goal_days) - 1)
+        self.bikes[rows[window]] = self.goal_days[days]
+
+    # returns the slot of the next user event of each of the rows, the time of the next
+    # event and whether it is a spawn
+    def _next_events(self, rows):
+        slots = np.argmin(self.user_time[rows], axis=1)
+        user_times = self.user_time[rows, slots]
+        return slots, np.minimum(user_times, self.next_spawn[rows]), self.next_spawn[rows] <= user_times
+
+    # processes the next event (see _next_events) of each of the rows
+    def _process(self, rows, slots, times, spawn):
+        r, t = rows[spawn], times[spawn]
+        spawning = self.spawning[r]
+        self._get(*self._spawn(r[spawning], t[spawning]))
+        self.next_spawn[r], self.spawning[r] = self._next_spawn(t)
+        states = self.user_state[rows, slots]
+        for state, counter, action in [(WALK, WAITING, self._get), (BIKE, BIKING, self._return)]:
+            arriving = ~spawn & (states == state)
+            np.add.at(self.counters, (rows[arriving], counter), -1)
+            action(rows[arriving], slots[arriving], times[arriving])
+        if self.use_truck:
+            self._redistribute(rows, times)
+
+    # prepares the arrays for the samples + 1 equidistant samples from 0 to end_time
+    def _start_sampling(self, end_time, samples):
+        self.sample_step = end_time / samples
+        self.sampled_bikes = np.zeros((len(self.rows), samples + 1, self.bikes.shape[1]), dtype=np.int16)
+        self.sampled_counters = np.zeros((len(self.rows), samples + 1, len(COUNTERS)), dtype=np.int32)
+        self.next_sample = np.zeros(len(self.rows), dtype=np.int64)
+
+    # returns the last sample before the time until
+    def _last_sample(self, until):
+        return min(self.sampled_bikes.shape[1] - 1, int(np.ceil(until / self.sample_step)) - 1)
+
+    # records the current state of the rows as their samples from the next one to last
+    # (inclusive), as one slice of the sample axis per row
+    def _record(self, rows, last):
+        counts = np.maximum(last - self.next_sample[rows] + 1, 0)
+        r = np.repeat(rows, counts)
+        offsets = np.arange(len(r)) - np.repeat(np.cumsum(counts) - counts, counts)
+        samples = np.repeat(self.next_sample[rows], counts) + offsets
+        self.sampled_bikes[r, samples] = self.bikes[r]
+        self.sampled_counters[r, samples] = self.counters[r]
+        self.next_sample[rows] += counts
+
+    # processes the events of the rows before the time until (or until all their samples
+    # are recorded), recording the samples between the events
+    def _advance(self, rows, until):
+        samples = self.sampled_bikes.shape[1] - 1
+        last = samples if np.isinf(until) else self._last_sample(until)
+        while len(rows) > 0:
+            slots, times, spawn = self._next_events(rows)
+            self._record(rows, np.minimum(np.floor(times / self.sample_step).astype(np.int64), last))
+            event = (self.next_sample[rows] <= samples) & (times < until)
+            rows = rows[event]
+            self._process(rows, slots[event], times[event], spawn[event])
+
+    # simulates the replications until end_time and returns the available bikes (shape
+    # (replications, samples + 1, stations)) and counters (shape (replications,
+    # samples + 1, counters)) at the samples + 1 equidistant times from 0 to end_time
+    def run(self, end_time, samples):
+        self._start_sampling(end_time, samples)
+        self._advance(self.rows, np.inf)
+        return self.sampled_bikes, self.sampled_counters
+
+# Approximate simulation with tau-leaping, e.g. to screen strategies and cooperation
+# levels before simulating them exactly.
+#
+# Time advances in fixed steps of tau minutes. In a step, the number of spawns at each
+# station is drawn at once (Poisson with the rate demand[sid][hour] * tau) and the
+# destinations as in the exact simulation (a multinomial draw per station). Users that
+# ride longer than until the end of their step do not take a slot but are counted in a
+# queue of the arrivals per step and destination, from which they arrive (at uniform
+# times within the step) when the step of their arrival is reached. All retrievals and
+# returns of a step are resolved at once against the bikes at the beginning of the step,
+# in the order of their times, so the step never takes more bikes (slots) from a station
+# than there are. Users that fail walk or ride on as in the exact simulation, and the
+# truck redistributes after the steps in its windows.
+#
+# Every step is a leap: since the retrievals and returns at a station are resolved in
+# the order of their times, stations close to empty or full need no exact fallback.
+# A leap costs about as much as the events of a minute in the exact simulation, so
+# tau-leaping is slower than the exact simulation for tau = 1 and only pays off for
+# steps of about 5 minutes or more.
+class TauLeaping(Simulation):
+
+    def __init__(self, parameters, replications, seed=None, tau=5.0):
+        super().__init__(parameters, replications, seed)
+        self.tau = float(tau)
+        self.step = 0
+        self.queue = np.zeros((replications, 1, len(self.capacity)), dtype=np.int32)
+
+    # lets the users ride like Simulation, but queues those that arrive after the step
+    def _ride(self, rows, slots, times, destinations, durations):
+        super()._ride(rows, slots, times, destinations, durations)
+        steps = np.floor(self.user_time[rows, slots] / self.tau).astype(np.int64)
+        queued = steps > self.step
+        rows, slots, steps, destinations = rows[queued], slots[queued], steps[queued], destinations[queued]
+        # (users arriving after the end of the simulation stay biking)
+        known = steps < self.queue.shape[1]
+        np.add.at(self.queue, (rows[known], steps[known], destinations[known]), 1)
+        self.user_time[rows, slots] = np.inf
+
+    # lets the queued users of the current step of the rows arrive at uniform times
+    # within the step
+    def _dequeue(self, rows):
+        counts = self.queue[rows, self.step]
+        r, stations = np.nonzero(counts)
+        n = counts[r, stations]
+        r, stations = np.repeat(rows[r], n), np.repeat(stations, n)
+        slots = self._free_slots(r)
+        self.user_state[r, slots] = BIKE
+        self.user_station[r, slots] = stations
+        self.user_origin[r, slots] = stations
+        self.user_destination[r, slots] = stations
+        self.user_fails[r, slots] = 0
+        self.user_time[r, slots] = (self.step + self.rng.random(len(r))) * self.tau
+
+    # returns whether the retrievals (get) and returns (not get) of bikes at the stations
+    # of the rows succeed, when they happen in the order of their times
+    def _resolve(self, rows, stations, times, get):
+        success = np.zeros(len(rows), dtype=bool)
+        order = np.lexsort((times, stations, rows))
+        cells = rows[order] * len(self.capacity) + stations[order]
+        rank = np.arange(len(order)) - np.searchsorted(cells, cells)
+        bikes = self.bikes.copy()
+        # (every station has at most one attempt of each rank)
+        for k in range(rank.max() + 1 if len(rank) > 0 else 0):
+            i = order[rank == k]
+            r, s = rows[i], stations[i]
+            success[i] = np.where(get[i], bikes[r, s] > 0, bikes[r, s] < self.capacity[s])
+            bikes[r, s] += np.where(success[i], np.where(get[i], -1, 1), 0)
+        return success
+
+    # simulates the current step of the rows with a leap
+    def _leap(self, rows, start, end):
+        # users that arrive at a station within the step
+        r, slots = np.nonzero(self.user_time[rows] < end)
+        r = rows[r]
+        times = self.user_time[r, slots]
+        states = self.user_state[r, slots]
+        np.add.at(self.counters, (r, np.where(states == WALK, WAITING, BIKING)), -1)
+        # spawns within the step
+        hour = int(start // 60) % 24
+        counts = self.rng.poisson(self.demand[:, hour] * self.tau, size=(len(rows), len(self.capacity)))
+        spawn_rows, stations = np.nonzero(counts)
+        n = counts[spawn_rows, stations]
+        spawn_rows, stations = np.repeat(rows[spawn_rows], n), np.repeat(stations, n)
+        spawn_rows, spawn_slots, spawn_times = self._spawn(spawn_rows, start + self.rng.random(len(spawn_rows)) * self.tau, stations)
+        r, slots, times = np.concatenate([r, spawn_rows]), np.concatenate([slots, spawn_slots]), np.concatenate([times, spawn_times])
+        get = np.concatenate([states == WALK, np.ones(len(spawn_rows), dtype=bool)])
+        success = self._resolve(r, self.user_station[r, slots], times, get)
+        self._get(r[get], slots[get], times[get], success[get])
+        self._return(r[~get], slots[~get], times[~get], success[~get])
+        if self.use_truck:
+            self._redistribute(rows, np.full(len(rows), start))
+
+    # simulates the replications like Simulation.run, in steps of tau
+    def run(self, end_time, samples):
+        self._start_sampling(end_time, samples)
+        n_steps = int(end_time // self.tau) + 1
+        self.queue = np.zeros((len(self.rows), n_steps, len(self.capacity)), dtype=np.int32)
+        for self.step in range(n_steps):
+            start, end = self.step * self.tau, (self.step + 1) * self.tau
+            self._dequeue(self.rows)
+            # (the samples of the step are taken at its beginning)
+            self._record(self.rows, self._last_sample(end))
+            self._leap(self.rows, start, end)
+        return self.sampled_bikes, self.sampled_counters
+
+# returns the statistics (number of replications, mean and sum of squared deviations
+# from the mean at each sample) of the measures of the replications. The samples are
+# summarized chunk samples at a time, so only the chunk is converted to floats.
+def _measure_statistics(bikes, counters, capacity, chunk=512):
+    parts = {}
+    for start in range(0, bikes.shape[1], chunk):
+        b, c = bikes[:, start:start + chunk], counters[:, start:start + chunk]
+        measures = {name: c[..., i] for i, name in enumerate(COUNTERS)}
+        fill = b / capacity * 100.0
+        measures['AvgAvailable'] = fill.mean(axis=2)
+        measures['MinAvailable'] = fill.min(axis=2)
+        measures['MaxAvailable'] = fill.max(axis=2)
+        measures['StarvedStations'] = (b <= 0).sum(axis=2)
+        measures['FullStations'] = (b >= capacity).sum(axis=2)
+        for sid in range(b.shape[2]):
+            measures['Available[sid={0}]'.format(sid)] = b[..., sid]
+        for name, values in measures.items():
+            values = values.astype(np.float64)
+            mean = values.mean(axis=0)
+            parts.setdefault(name, []).append((mean, ((values - mean) ** 2).sum(axis=0)))
+    return {name: (len(bikes), np.concatenate([mean for mean, _ in part]), np.concatenate([m2 for _, m2 in part]))
+            for name, part in parts.items()}
+
+# returns the statistics of the union of the replications of two statistics
+def _merge_statistics(a, b):
+    if a is None:
+        return b
+    merged = {}
+    for name in a:
+        (n_a, mean_a, m2_a), (n_b, mean_b, m2_b) = a[name], b[name]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        merged[name] = (n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n)
+    return merged
+
+# simulates the replications start ... end - 1 (with tau-leaping if tau is given),
+# writes their trajectories and returns the statistics of the measures
+def _simulate_batch(parameters, start, end, end_time, samples, seed, prefix, trace_format, tau=None):
+    if tau is None:
+        simulation = Simulation(parameters, end - start, [seed, start])
+    else:
+        simulation = TauLeaping(parameters, end - start, [seed, start], tau)
+    bikes, counters = simulation.run(end_time, samples)
+    capacity = parameters['capacity']
+    for i in range(end - start):
+        # (the readers prefer binary trajectories, so the other format is removed)
+        binary = trace_format == 'binary'
+        stale = '{0}{1}.{2}'.format(prefix, start + i, 'csv' if binary else 'bin')
+        if os.path.exists(stale):
+            os.remove(stale)
+        if binary:
+            write_trace('{0}{1}.bin'.format(prefix, start + i), bikes[i], capacity, end_time / samples)
+        else:
+            write_trace_csv('{0}{1}.csv'.format(prefix, start + i), bikes[i], capacity, end_time / samples)
+    print('Saved trajectories {0} to {1}'.format(start, end - 1))
+    return _measure_statistics(bikes, counters, capacity)
+
+# simulates the replications, batch_size (by default BATCH_SIZE) at a time on the given
+# number of processes, writes their trajectories to
+# prefix<N> in the given format ('binary' or 'csv') and returns the statistics of all
+# measures. If tau is given, the replications are
+# approximated with tau-leaping (see TauLeaping) in steps of tau minutes.
+def simulate(parameters, replications, end_time, samples, seed, prefix, trace_format='csv', batch_size=None, processes=1,
+             tau=None):
+    batch_size = batch_size or BATCH_SIZE
+    batches = [(parameters, start, min(start + batch_size, replications), end_time, samples, seed, prefix, trace_format, tau)
+               for start in range(0, replications, batch_size)]
+    statistics = None
+    if processes > 1 and len(batches) > 1:
+        with multiprocessing.Pool(min(processes, len(batches))) as pool:
+            results = pool.starmap(_simulate_batch, batches)
+    else:
+        results = itertools.starmap(_simulate_batch, batches)
+    for batch in results:
+        statistics = _merge_statistics(statistics, batch)
+    return statistics
+
+# writes the statistics of each measure to directory/<measure>.csv with the rows time,
+# mean, stddev and stderr (like MyCLI.jar)
+def write_results(directory, statistics, end_time, samples):
+    for name, (n, mean, m2) in statistics.items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = np.sqrt(m2 / (n - 1))
+        times = np.arange(len(mean)) * (end_time / samples)
+        np.savetxt(os.path.join(directory, name + '.csv'), np.column_stack([times, mean, deviation, deviation / np.sqrt(n)]),
+                   fmt='%f', delimiter=',')
@@ -0,0 +1,71 @@
+# Sequential statistical model checking of the SSTL formulas.
+#
+# The satisfaction probability of a formula at a station is estimated from the
+# trajectories evaluated so far (see bss/sstl.py). Instead of always evaluating all
+# replications, the trajectories can be evaluated in rounds until the estimates are
+# good enough for every formula, parameter and station. An estimate is good enough if
+#
+# - its confidence interval (Wilson score or Chernoff-Hoeffding bound) is at most
+#   width wide, or
+# - a sequential probability ratio test (SPRT) decided whether the probability lies
+#   above or below a threshold (with an indifference region of +- indifference around
+#   the threshold and error probabilities of 1 - confidence).
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+# returns the lower and upper bound of the Wilson score interval for the probability
+# estimated from the given number of successes out of n trials
+def wilson_interval(successes, n, confidence=0.95):
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = np.asarray(successes, dtype=float) / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half = z / denominator * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return np.clip(centre - half, 0.0, 1.0), np.clip(centre + half, 0.0, 1.0)
+
+# returns the lower and upper bound of the interval around the estimated probability
+# given by the Chernoff-Hoeffding bound
+def hoeffding_interval(successes, n, confidence=0.95):
+    p = np.asarray(successes, dtype=float) / n
+    half = math.sqrt(math.log(2 / (1 - confidence)) / (2 * n))
+    return np.clip(p - half, 0.0, 1.0), np.clip(p + half, 0.0, 1.0)
+
+INTERVALS = {
+    'wilson': wilson_interval,
+    'hoeffding': hoeffding_interval,
+}
+
+# returns the decision of the sequential probability ratio test whether the probability
+# is at least threshold + indifference (1) or at most threshold - indifference (-1), or
+# 0 if more trials are needed
+def sprt(successes, n, threshold, indifference=0.01, confidence=0.95):
+    above = threshold + indifference
+    below = threshold - indifference
+    if below <= 0 or above >= 1:
+        raise ValueError('threshold +- indifference must lie within (0, 1)')
+    successes = np.asarray(successes, dtype=float)
+    ratio = successes * math.log(below / above) + (n - successes) * math.log((1 - below) / (1 - above))
+    error = 1 - confidence
+    decision = np.zeros(successes.shape, dtype=int)
+    decision[ratio <= math.log(error / (1 - error))] = 1
+    decision[ratio >= math.log((1 - error) / error)] = -1
+    return decision
+
+# returns whether the estimates of all formulas in statistics (see bss/sstl.py) are good
+# enough: their interval is at most width wide or the SPRT with the threshold decided
+def converged(statistics, width=None, confidence=0.95, interval='wilson', threshold=None, indifference=0.01):
+    if width is None and threshold is None:
+        return False
+    for formula in statistics.values():
+        done = np.zeros(formula['sum'].shape, dtype=bool)
+        if width is not None:
+            lower, upper = INTERVALS[interval](formula['sum'], formula['n'], confidence)
+            done |= upper - lower <= width
+        if threshold is not None:
+            done |= sprt(formula['sum'], formula['n'], threshold, indifference, confidence) != 0
+        if not done.all():
+            return False
+    return True
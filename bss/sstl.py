@@ -0,0 +1,164 @@
+# Boolean evaluation of the SSTL formulas of the study without jSSTL.
+#
+# Implements the boolean semantics of the formulas phi_time, phi_dist, phi_empty,
+# phi_full and phi_prob (see BSSFormulasMulti in sstl/bss-sstl) for the trajectories
+# of many replications at once. A signal is an array of shape (replications, time,
+# stations, 2) with the available bikes and slots of every station, sampled once per
+# minute from time 0 (like the trajectories in Traces/).
+#
+# The temporal operators only look at windows of samples, so they are evaluated with
+# cumulative sums along the time axis: a property holds somewhere in the window [a, b]
+# if its count at b + 1 differs from its count at a. The spatial operator (somewhere
+# within distance d) is a product of the signal with the matrix of the stations that
+# are at most d apart (shortest distances in the graph, see bss/graph.py).
+#
+# The satisfaction of every formula and parameter is summarized per station like
+# SignalStatistics of jSSTL does, so the results in Formulas/ have the same format as
+# those of jSSTLEvalMulti.jar.
+#
+# The trajectories are evaluated in batches, which can be distributed over a pool of
+# processes. Every batch only returns its sums, sums of squares, minima and maxima,
+# which are merged afterwards. The satisfaction is either 0 or 1, so the sums are exact
+# in any order and the results do not depend on the number of processes. The evaluation
+# can stop before all trajectories are evaluated once the estimates are precise enough
+# (sequential statistical model checking, see bss/smc.py).
+
+import itertools
+import multiprocessing
+import numpy as np
+
+from bss.traces import read_trajectory
+
+# final time of the formulas
+T_END = 4319
+
+# parameters of the formulas (as in EvaluateBSSMulti)
+DAYS = [(1440 * day, 1440 * day + 1439) for day in range(3)]
+PARAMETERS = {
+    'phi_time': [{'t': t} for t in range(11)],
+    'phi_dist': [{'d': 50.0 * d} for d in range(11)],
+    'phi_empty': [{'T_start': start, 'T_end': end} for start, end in DAYS],
+    'phi_full': [{'T_start': start, 'T_end': end} for start, end in DAYS],
+    'phi_prob': [{'ts': 360 * i, 'te': 360 * i + 359} for i in range(12)] + [{'ts': start, 'te': end} for start, end in DAYS],
+}
+
+# returns the cumulative counts (along the time axis, starting with 0) of the samples
+# where the boolean array values is true
+def _counts(values):
+    counts = np.zeros((values.shape[0], values.shape[1] + 1) + values.shape[2:], dtype=np.int32)
+    np.cumsum(values, axis=1, out=counts[:, 1:])
+    return counts
+
+# returns whether the property with the given cumulative counts holds at least once
+# in the window [start, end] (inclusive, in samples)
+def _eventually(counts, start, end):
+    return counts[:, end + 1] > counts[:, start]
+
+# returns whether the property with the given cumulative counts holds at every sample
+# in the window [start, end]
+def _globally(counts, start, end):
+    return counts[:, end + 1] - counts[:, start] == end - start + 1
+
+# returns whether there is a station at a distance of at most d from each station,
+# for which values (shape (replications, time, stations)) is true
+def _somewhere(values, near):
+    return np.matmul(values.astype(np.float32), near.T.astype(np.float32)) > 0
+
+# returns a dict with the boolean satisfaction (shape (parameters, replications,
+# stations)) of each formula at time 0 for the given signal and distance matrix
+def check_formulas(signal, distances):
+    bikes = signal[..., 0] > 0
+    slots = signal[..., 1] > 0
+    available = _counts(bikes & slots)
+    empty = _counts(~bikes)
+    full = _counts(~slots)
+
+    satisfaction = {}
+    # phi_time: always (until T_END - t) within t minutes there is a bike and a slot
+    time = []
+    for p in PARAMETERS['phi_time']:
+        end = T_END - p['t']
+        window = available[:, p['t'] + 1:end + p['t'] + 2] > available[:, :end + 1]
+        time.append(window.all(axis=1))
+    satisfaction['phi_time'] = np.array(time)
+    # phi_dist: always there is a bike and a slot within distance d
+    dist = []
+    for p in PARAMETERS['phi_dist']:
+        near = distances <= p['d']
+        somewhere = _counts(_somewhere(bikes, near) & _somewhere(slots, near))
+        dist.append(_globally(somewhere, 0, T_END))
+    satisfaction['phi_dist'] = np.array(dist)
+    # phi_empty / phi_full: the station is eventually empty / full during the day
+    satisfaction['phi_empty'] = np.array([_eventually(empty, p['T_start'], p['T_end']) for p in PARAMETERS['phi_empty']])
+    satisfaction['phi_full'] = np.array([_eventually(full, p['T_start'], p['T_end']) for p in PARAMETERS['phi_full']])
+    # phi_prob: there is always a bike and a slot during [ts, te]
+    satisfaction['phi_prob'] = np.array([_globally(available, p['ts'], p['te']) for p in PARAMETERS['phi_prob']])
+    return satisfaction
+
+# returns the statistics (number of replications, sum, sum of squares, min and max over
+# the replications) of the satisfaction of each formula returned by check_formulas
+def formula_statistics(satisfaction):
+    statistics = {}
+    for formula, sat in satisfaction.items():
+        sat = sat.astype(float)
+        statistics[formula] = {
+            'n': sat.shape[1],
+            'sum': sat.sum(axis=1),
+            'square': (sat * sat).sum(axis=1),
+            'min': sat.min(axis=1),
+            'max': sat.max(axis=1),
+        }
+    return statistics
+
+# returns the statistics of the union of the replications of two statistics
+def merge_statistics(a, b):
+    if a is None:
+        return b
+    return {formula: {
+        'n': a[formula]['n'] + b[formula]['n'],
+        'sum': a[formula]['sum'] + b[formula]['sum'],
+        'square': a[formula]['square'] + b[formula]['square'],
+        'min': np.minimum(a[formula]['min'], b[formula]['min']),
+        'max': np.maximum(a[formula]['max'], b[formula]['max']),
+    } for formula in a}
+
+# writes the statistics of a formula to the csv file at path, with the rows
+# par, loc, prob, min, max, stddev (like SignalStatistics of jSSTL computes them)
+def write_formula(path, statistics):
+    n = statistics['n']
+    average = statistics['sum'] / n
+    variance = statistics['square'] / n - average * average
+    deviation = np.sqrt(variance / n)
+    with open(path, 'w') as file:
+        for k in range(average.shape[0]):
+            for l in range(average.shape[1]):
+                file.write('{0},{1},{2:.10f},{3:.10f},{4:.10f},{5:.10f}\n'.format(
+                    k, l, average[k, l], statistics['min'][k, l], statistics['max'][k, l], deviation[k, l]))
+
+# returns the statistics of the formulas on the trajectories of the replications start
+# ... end - 1 (see bss/traces.py)
+def _evaluate_batch(prefix, start, end, distances):
+    signal = np.array([read_trajectory(prefix, r, len(distances)) for r in range(start, end)])
+    return formula_statistics(check_formulas(signal, distances))
+
+# evaluates the formulas on the trajectories prefix0 ... prefix<replications - 1>,
+# batch_size replications at a time (on the given number of processes), and returns the
+# merged statistics. If stop is given, the batches are evaluated in rounds (one batch per
+# process) and the evaluation ends early as soon as stop returns True for the statistics
+# of the trajectories evaluated so far (see bss/smc.py).
+def evaluate_trajectories(prefix, replications, distances, batch_size=50, processes=1, stop=None):
+    batches = [(prefix, start, min(start + batch_size, replications), distances) for start in range(0, replications, batch_size)]
+    rounds = [batches] if stop is None else [batches[i:i + processes] for i in range(0, len(batches), processes)]
+    pool = multiprocessing.Pool(min(processes, len(batches))) if processes > 1 and len(batches) > 1 else None
+    statistics = None
+    try:
+        for batches in rounds:
+            results = pool.starmap(_evaluate_batch, batches) if pool is not None else itertools.starmap(_evaluate_batch, batches)
+            for batch in results:
+                statistics = merge_statistics(statistics, batch)
+            if stop is not None and stop(statistics):
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return statistics
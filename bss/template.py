@@ -0,0 +1,51 @@
+# Rendering of parametrized models from a template.
+#
+# A template contains sections that are enclosed by marker comments:
+#
+#     // NAME START
+#     // NAME END
+#
+# Rendering replaces everything between the two markers with the text of the
+# section. The markers are kept, so a rendered model can be told apart from the
+# template, but the template itself is never modified.
+
+import os
+import re
+
+from bss import cache
+
+# a section from its start marker up to (excluding) its end marker
+SECTION = re.compile(r'// (\w+) START\n(.*?)(?=// \1 END)', re.DOTALL)
+
+# returns the template with the contents of each section replaced by sections[name].
+# Sections without an entry keep their contents from the template.
+def render(template, sections):
+    def substitute(match):
+        if match.group(1) not in sections:
+            return match.group(0)
+        return '// {0} START\n{1}'.format(match.group(1), sections[match.group(1)])
+    return SECTION.sub(substitute, template)
+
+# returns a list literal in the CARMA syntax ([:a, b, c:]) of the given values
+def carma_list(values):
+    return '[:' + ', '.join(str(value) for value in values) + ':]'
+
+# returns the directory the parametrized model and experiment file of the experiment
+# with the given settings are written to (setting `model_dir`, defaults to Models/<name>)
+def get_model_dir(settings):
+    return settings.get('model_dir', os.path.join('Models', settings.get('name', 'default')))
+
+# returns the contents of section name, which are built by calling build. The contents are
+# cached by the given inputs (json serializable, e.g. hashes of the data and settings), so
+# build is only called if there is no entry for the same inputs yet (or if refresh is True,
+# in which case the entry is built again and replaced).
+def cached_section(name, inputs, build, refresh=False):
+    key = cache.make_key(name, inputs)
+    directory = None if refresh else cache.lookup('sections', key)
+    if directory is None:
+        def write(directory):
+            with open(os.path.join(directory, 'section.txt'), 'w', newline='') as file:
+                file.write(build())
+        directory = cache.store('sections', key, write, replace=refresh)
+    with open(os.path.join(directory, 'section.txt'), 'r', newline='') as file:
+        return file.read()
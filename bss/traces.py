@@ -0,0 +1,158 @@
+# Trajectories of the simulation (Traces/).
+#
+# The simulator writes the trajectory of each replication N either as text
+# (Traj<N>.csv, one line `time,location,bikes,slots` per sample and station) or in
+# a binary format (Traj<N>.bin), which takes 2 bytes per sample and station and can
+# be mapped into memory without parsing. A binary trajectory consists of a header of
+# 32 bytes (little endian):
+#
+#     magic bytes `BSSTRAJ1` | int32 samples | int32 stations | float64 time between
+#     two samples | 8 reserved bytes
+#
+# followed by the capacities of the stations (int16[stations]) and the available
+# bikes (int16[samples, stations], one row per sample). The free slots are the
+# capacities minus the available bikes.
+#
+# TraceStore gives access to all trajectories of a directory by replication, station
+# and time, without loading more than what is selected into memory.
+
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# magic bytes at the beginning of a binary trajectory
+TRACE_MAGIC = b'BSSTRAJ1'
+
+# header of a binary trajectory
+TRACE_HEADER = np.dtype([('magic', 'S8'), ('samples', '<i4'), ('stations', '<i4'), ('step', '<f8'), ('reserved', '<i8')])
+
+# writes the available bikes (shape (samples, stations)) of a trajectory with the given
+# capacities of the stations and time between two samples to path in the binary format
+def write_trace(path, bikes, capacities, step=1.0):
+    header = np.zeros(1, dtype=TRACE_HEADER)
+    header['magic'] = TRACE_MAGIC
+    header['samples'], header['stations'] = bikes.shape
+    header['step'] = step
+    with open(path, 'wb') as file:
+        file.write(header.tobytes())
+        file.write(np.asarray(capacities, dtype='<i2').tobytes())
+        file.write(np.asarray(bikes, dtype='<i2').tobytes())
+
+# writes the trajectory like write_trace, but as text (one line `time,location,bikes,slots`
+# per sample and station, formatted like the trajectories of the simulator)
+def write_trace_csv(path, bikes, capacities, step=1.0):
+    samples, stations = bikes.shape
+    times = np.repeat(np.arange(samples) * step, stations).tolist()
+    locations = np.tile(np.arange(stations), samples).tolist()
+    available = bikes.ravel().astype(np.float64)
+    slots = (np.asarray(capacities) - bikes).ravel().astype(np.float64)
+    with open(path, 'w') as file:
+        file.writelines('{0!r},{1},{2!r},{3!r}\n'.format(*line) for line in zip(times, locations, available.tolist(), slots.tolist()))
+
+# returns the header (samples, stations, step) of the binary trajectory at path
+def read_trace_header(path):
+    header = np.fromfile(path, dtype=TRACE_HEADER, count=1)
+    if len(header) == 0 or header['magic'][0] != TRACE_MAGIC:
+        raise ValueError('{0} is not a trajectory file'.format(path))
+    return int(header['samples'][0]), int(header['stations'][0]), float(header['step'][0])
+
+# returns the capacities and the memory mapped available bikes (shape (samples,
+# stations)) of the binary trajectory at path
+def read_trace(path):
+    samples, stations, step = read_trace_header(path)
+    capacities = np.fromfile(path, dtype='<i2', count=stations, offset=TRACE_HEADER.itemsize)
+    bikes = np.memmap(path, dtype='<i2', mode='r', offset=TRACE_HEADER.itemsize + 2 * stations, shape=(samples, stations))
+    return capacities, bikes
+
+# returns the signal (shape (samples, stations, 2), available bikes and free slots) of
+# the trajectory of the given replication, from prefix<replication>.bin if it exists and
+# from prefix<replication>.csv otherwise
+def read_trajectory(prefix, replication, n_stations):
+    path = '{0}{1}.bin'.format(prefix, replication)
+    if os.path.exists(path):
+        capacities, bikes = read_trace(path)
+        if bikes.shape[1] != n_stations:
+            raise ValueError('{0} has {1} stations instead of {2}'.format(path, bikes.shape[1], n_stations))
+        return np.stack([bikes, capacities - bikes], axis=-1).astype(np.float64)
+    values = pd.read_csv('{0}{1}.csv'.format(prefix, replication), header=None, usecols=[2, 3], dtype=np.float64).values
+    return values.reshape(-1, n_stations, 2)
+
+# Lazy access to all trajectories in a directory (e.g. Traces/). Binary trajectories
+# are memory mapped, so selecting stations or a time slice of a replication only reads
+# that part of the file. Trajectories that only exist as csv files are parsed when they
+# are accessed.
+#
+#     store = TraceStore('Traces')
+#     store.bikes(3, stations=[0, 5], times=slice(0, 1440))
+#     for replications, bikes in store.batches(50):
+#         ...
+class TraceStore:
+
+    TRAJECTORY = re.compile(r'^Traj(\d+)\.(bin|csv)$')
+
+    def __init__(self, directory='Traces', n_stations=None):
+        self.directory = directory
+        self.prefix = os.path.join(directory, 'Traj')
+        self.replications = sorted({int(match.group(1)) for match in map(self.TRAJECTORY.match, os.listdir(directory)) if match})
+        self._n_stations = n_stations
+
+    def __len__(self):
+        return len(self.replications)
+
+    # returns the path of the binary trajectory of the replication, None if there is none
+    def _binary(self, replication):
+        path = '{0}{1}.bin'.format(self.prefix, replication)
+        return path if os.path.exists(path) else None
+
+    # number of stations (from the first trajectory)
+    @property
+    def n_stations(self):
+        if self._n_stations is None:
+            path = self._binary(self.replications[0])
+            if path is not None:
+                self._n_stations = read_trace_header(path)[1]
+            else:
+                times = pd.read_csv('{0}{1}.csv'.format(self.prefix, self.replications[0]), header=None, usecols=[0], nrows=1 << 16)[0].values
+                self._n_stations = int((times == times[0]).sum())
+        return self._n_stations
+
+    # capacities of the stations (from the first trajectory)
+    @property
+    def capacities(self):
+        path = self._binary(self.replications[0])
+        if path is not None:
+            return read_trace(path)[0]
+        first = read_trajectory(self.prefix, self.replications[0], self.n_stations)[0]
+        return (first[:, 0] + first[:, 1]).astype(np.int16)
+
+    # returns the available bikes of the replication at the given times (samples) and
+    # stations, as array of shape (times, stations). times and stations are indexed one
+    # after the other, so lists of both select every combination. For binary trajectories
+    # and slices, this is a view of the memory mapped file.
+    def bikes(self, replication, stations=slice(None), times=slice(None)):
+        path = self._binary(replication)
+        if path is not None:
+            return read_trace(path)[1][times][:, stations]
+        return read_trajectory(self.prefix, replication, self.n_stations)[times][:, stations, 0]
+
+    # returns the free slots of the replication at the given times and stations
+    def slots(self, replication, stations=slice(None), times=slice(None)):
+        path = self._binary(replication)
+        if path is not None:
+            capacities, bikes = read_trace(path)
+            return capacities[stations] - bikes[times][:, stations]
+        return read_trajectory(self.prefix, replication, self.n_stations)[times][:, stations, 1]
+
+    # returns the signal (available bikes and free slots, see read_trajectory) of the
+    # replication at the given times and stations, as array of shape (times, stations, 2)
+    def signal(self, replication, stations=slice(None), times=slice(None)):
+        return np.stack([self.bikes(replication, stations, times), self.slots(replication, stations, times)], axis=-1).astype(np.float64)
+
+    # yields the replications and their available bikes at the given times and stations
+    # (array of shape (replications, times, stations)) in batches of size replications,
+    # so all replications can be processed without loading them at once
+    def batches(self, size, stations=slice(None), times=slice(None)):
+        for start in range(0, len(self.replications), size):
+            replications = self.replications[start:start + size]
+            yield replications, np.array([self.bikes(r, stations, times) for r in replications])
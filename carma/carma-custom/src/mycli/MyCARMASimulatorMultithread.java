@@ -9,15 +9,25 @@
  * nthreads must be divisor of number of replications
  * specified in the experiments file.
  * 
+ * The trajectories are written to <path>/Traces/Traj<N>.csv,
+ * or to Traj<N>.bin in a binary format if the system
+ * property traces is set to binary (java -Dtraces=binary ...).
+ * 
  */
 
 package mycli;
 
 import java.io.BufferedReader;
 import java.io.BufferedWriter;
+import java.io.File;
+import java.io.FileOutputStream;
 import java.io.FileReader;
 import java.io.IOException;
 import java.io.PrintWriter;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
 import java.text.DateFormat;
 import java.text.SimpleDateFormat;
 import java.util.ArrayList;
@@ -85,6 +95,16 @@ public class MyCARMASimulatorMultithread implements Callable<Object>, Runnable {
 	
 	private Long seed;
 	
+	/**
+	 * Whether the trajectories are written in the binary format
+	 * (java -Dtraces=binary ...) or as csv files (default).
+	 */
+	private static final boolean BINARY_TRACES = "binary".equals(System.getProperty("traces", "csv"));
+	
+	private static final byte[] TRACE_MAGIC = "BSSTRAJ1".getBytes(StandardCharsets.US_ASCII);
+	
+	private static final int TRACE_HEADER_SIZE = 32;
+	
 
 	public MyCARMASimulatorMultithread(String name, CarmaModel model, String system, int replications,
 			double simulationTime, int samplings, List<MeasureData> measures, String modelName) {
@@ -366,26 +386,62 @@ public class MyCARMASimulatorMultithread implements Callable<Object>, Runnable {
 					}
 				}
 			}
-			// save the trajectory to a csv file
+			// save the trajectory to a binary or csv file (and remove the trajectory
+			// of a previous run in the other format, as readers prefer binary files)
 			int trajNum = start + i;
-			PrintWriter writer = new PrintWriter(path + "Traces/Traj" + trajNum + ".csv");
-			BufferedWriter bwriter = new BufferedWriter(writer);
-			double samplingRatio = (simulationTime / samplings);
-			for (int t = 0; t < trajectories[0].length; t++) {
-				for (int s = 0; s < trajectories.length; s++) {
-					bwriter.write((t * samplingRatio) + ",");
-					bwriter.write(s + ",");
-					bwriter.write(trajectories[s][t] + ",");
-					bwriter.write((capacities[s] - trajectories[s][t]) + "\n");
+			new File(path + "Traces/Traj" + trajNum + (BINARY_TRACES ? ".csv" : ".bin")).delete();
+			if (BINARY_TRACES) {
+				writeBinaryTrajectory(path + "Traces/Traj" + trajNum + ".bin", trajectories, capacities);
+			} else {
+				PrintWriter writer = new PrintWriter(path + "Traces/Traj" + trajNum + ".csv");
+				BufferedWriter bwriter = new BufferedWriter(writer);
+				double samplingRatio = (simulationTime / samplings);
+				for (int t = 0; t < trajectories[0].length; t++) {
+					for (int s = 0; s < trajectories.length; s++) {
+						bwriter.write((t * samplingRatio) + ",");
+						bwriter.write(s + ",");
+						bwriter.write(trajectories[s][t] + ",");
+						bwriter.write((capacities[s] - trajectories[s][t]) + "\n");
+					}
 				}
+				bwriter.flush();
+				bwriter.close();
 			}
-			bwriter.flush();
-			bwriter.close();
 			report("Saved Trajectory " + trajNum);
 		}
 		return new ThreadResult(results, resultsNames);
 	}
 	
+	// writes the trajectory (available bikes of each station at each sample) in the
+	// binary format: a header of 32 bytes (magic bytes, number of samples, number of
+	// stations, time between two samples, reserved), the capacities of the stations
+	// and the available bikes at each sample as 16 bit integers (little endian).
+	// The free slots are the capacities minus the available bikes (see bss/traces.py).
+	private void writeBinaryTrajectory(String filename, double[][] trajectories, int[] capacities) throws IOException {
+		int stations = trajectories.length;
+		int samples = trajectories[0].length;
+		ByteBuffer buffer = ByteBuffer.allocate(TRACE_HEADER_SIZE + 2 * stations * (samples + 1)).order(ByteOrder.LITTLE_ENDIAN);
+		buffer.put(TRACE_MAGIC);
+		buffer.putInt(samples);
+		buffer.putInt(stations);
+		buffer.putDouble(simulationTime / samplings);
+		buffer.putLong(0);
+		for (int s = 0; s < stations; s++) {
+			buffer.putShort((short) capacities[s]);
+		}
+		for (int t = 0; t < samples; t++) {
+			for (int s = 0; s < stations; s++) {
+				buffer.putShort((short) Math.round(trajectories[s][t]));
+			}
+		}
+		buffer.flip();
+		try (FileOutputStream out = new FileOutputStream(filename); FileChannel channel = out.getChannel()) {
+			while (buffer.hasRemaining()) {
+				channel.write(buffer);
+			}
+		}
+	}
+	
 	// runs a single replication and returns the outcome
 	public SimulationOutcome RunSingle(int number, int seed) {
 		// set up simulation environment (simulation, seed, sampling)
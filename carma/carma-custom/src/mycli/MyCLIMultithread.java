@@ -4,7 +4,10 @@
  * handles reading the command line parameters and
  * the experiment file.
  * 
- * usage: MyCLIMutlithread <nthreads> <seed> <path>/
+ * usage: MyCLIMutlithread <nthreads> <seed> <path>/ [<experiment>]
+ * 
+ * experiment is the experiment file to run and defaults
+ * to <path>/experiment.exp.
  * 
  * nthreads must be divisor of number of replications
  * specified in the experiments file.
@@ -34,7 +37,8 @@ public class MyCLIMultithread {
 			if (args[2].equals("/")) {
 				args[2] = "";
 			}
-			MyCARMASimulatorMultithread sim = readExperiment(args[2] + "experiment.exp");
+			String experiment = args.length > 3 ? args[3] : args[2] + "experiment.exp";
+			MyCARMASimulatorMultithread sim = readExperiment(experiment);
 			try {
 				sim.Run(Integer.parseInt(args[0]), Integer.parseInt(args[1]), args[2]);
 			} catch(NumberFormatException e) {
@@ -46,7 +50,7 @@ public class MyCLIMultithread {
 	}
 	
 	private static void printUsage() {
-		System.out.println("usage: MyCLIMultithread <nthreads> <seed> <path>/");
+		System.out.println("usage: MyCLIMultithread <nthreads> <seed> <path>/ [<experiment>]");
 	}
 	
 	/* Read experiment file */
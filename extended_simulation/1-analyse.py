@@ -14,10 +14,14 @@
 # that can be used for comparison with the validations stats (stats_validation.txt)
 
 import json
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.append('..')
+from bss.records import read_records
+
 # load settings from file
 settings = {}
 with open('settings.json', 'r') as file:
@@ -29,8 +33,8 @@ output_dir = settings['output_dir']
 # load stations list from csv file
 stations = pd.read_csv('stations.csv')
 
-# load records from csv file
-dataset = pd.read_csv('records.csv', parse_dates=['started_at', 'ended_at'], index_col=0)
+# load records
+dataset = read_records('records.npz', columns=['ended_at', 'duration', 'start_station_name', 'end_station_name'])
 
 d = dataset.resample('D').count()
 d = d[d.duration > 0]
@@ -74,7 +78,7 @@ medain trip duration: {5} m
     )
 
 # stats validation
-dataset_validation = pd.read_csv('records_validation.csv', parse_dates=['started_at', 'ended_at'], index_col=0)
+dataset_validation = read_records('records_validation.npz', columns=['duration'])
 days_in_set = dataset_validation.resample('D').count()
 days_in_set = days_in_set[days_in_set.duration > 0]
 days_in_set = len(days_in_set)
@@ -137,7 +141,7 @@ with open(output_dir + '/station_numbers.txt', 'w+') as file:
 
 # visualize roundtrips per station
 roundtrips = dataset[dataset.start_station_name == dataset.end_station_name]
-roundtrips = roundtrips.groupby('start_station_name').count()
+roundtrips = roundtrips.groupby('start_station_name', observed=True).count()
 fig, ax = plt.subplots()
 fig.set_size_inches(12, 8)
 ax.set_title('Number of Roundtrips per Month')
@@ -156,8 +160,8 @@ ax.set_title('Total Arrivals and Departures from Stations per Month')
 ax.set_xlabel('station name')
 ax.set_ylabel('absolute frequency')
 width = 0.35
-dar = dataset.groupby('end_station_name').count().reset_index()
-dde = dataset.groupby('start_station_name').count().reset_index()
+dar = dataset.groupby('end_station_name', observed=True).count().reset_index()
+dde = dataset.groupby('start_station_name', observed=True).count().reset_index()
 ar = ax.bar(dar.index, dar.duration, width)
 de = ax.bar(dar.index + width, dde.duration, width)
 ax.set_xticks(dar.index + width / 2)
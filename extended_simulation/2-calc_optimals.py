@@ -1,82 +1,81 @@
 # @author justinnk
 # calculates optimal allocations to satisfy the average demand of one day.
-# uses a hill climbing algorithm to keep the number of available bikes between 3 and capacity-3.
+# The average hourly net change of all stations is computed once (see `bss/profiles.py`).
+# From it, the range of initial fill levels that keeps the number of available bikes between
+# 4 and capacity-4 follows directly, and the centre of that range is used (see `bss/optimals.py`).
+# If `optimals_fixed_fleet` is set in the settings, the allocations are shifted so that the total
+# number of bikes stays the same as in `station_available`.
+# The same is done with the demand of each weekday separately (`station_optimal_<weekday>`) and
+# for each simulated day (`station_optimal_day<N>`), which are the goals of the redistribution
+# truck. If `simulation_weekdays` is set, simulated day N is the N-th weekday of that list
+# (repeated if needed), otherwise every day uses the average demand.
 
+import json
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-def get_availability(station, departure_frame, arrival_frame, available):
+sys.path.append('..')
+from bss.optimals import feasible_range, optimal_allocation
+from bss.profiles import load_hourly_profiles
 
-    filler = pd.DataFrame(index=pd.date_range(departure_frame.index.min().floor('H'), departure_frame.index.max().floor('H'), freq="60min"))
-    filler = filler[np.isin(filler.index.date, departure_frame.index.date)] # departure_frame for both because of possible endings in unwanted (validation) days
+# load settings from file
+settings = {}
+with open('settings.json', 'r') as file:
+    settings = json.loads(file.read())
 
-    dep_dayly = departure_frame[departure_frame['start_station_name'] == station.station_name]
-    dep_dayly = dep_dayly.resample('60Min').count()
-    dep_dayly = dep_dayly.join(filler, how='right').fillna(0.0)
-    dep_dayly = dep_dayly.groupby(dep_dayly.index.hour).mean()
-    dep_dayly = dep_dayly.rename(columns={'start_station_name': 'departures'})
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
 
-    arr_dayly = arrival_frame[(arrival_frame['end_station_name'] == station.station_name) & ~(arrival_frame.index.date != departure_frame.index.date)]
-    arr_dayly = arr_dayly.resample('60Min').count()
-    arr_dayly = arr_dayly.join(filler, how='right').fillna(0.0)
-    arr_dayly = arr_dayly.groupby(arr_dayly.index.hour).mean()
-    arr_dayly = arr_dayly.rename(columns={'end_station_name': 'arrivals'})
+stations_aug = pd.read_csv('stations.csv')
+capacity = stations_aug.station_capacity.values
 
-    change = arr_dayly['arrivals'] - dep_dayly['departures']
-    start = available
-    cap = []
-    for i in range(0, 24):
-        if i == 0:
-            cap.append(float(start) + change[i])
-        else:
-            cap.append(cap[i - 1] + change[i])
-    cap = np.array(cap)
-    return cap
+# average number of departures and arrivals per station and hour of the day
+departures, arrivals = load_hourly_profiles('records.npz', len(stations_aug))
+net_change = arrivals - departures
 
-departures_aug = pd.read_csv('records.csv', usecols=['started_at', 'start_station_name'], index_col='started_at', parse_dates=['started_at'])
-arrivals_aug = pd.read_csv('records.csv', usecols=['ended_at', 'end_station_name'], index_col='ended_at', parse_dates=['ended_at'])
-stations_aug = pd.read_csv('stations.csv')
+# keep the number of bikes in the system fixed?
+total = None
+if settings.get('optimals_fixed_fleet', False):
+    total = int(stations_aug.station_available.sum())
+
+availability_optimal = optimal_allocation(net_change, capacity, total)
 
-availability = []
+lower, upper = feasible_range(net_change, capacity)
 for i, s in stations_aug.iterrows():
-    problematic = True
-    up = False
-    last_up = False
-    counter = 0
-    percent = 0.45
-    while problematic:
-        print(s.station_name, percent)
-        last_up = up
-        available = int(s.station_capacity * percent)
-        cap = get_availability(stations_aug[stations_aug.station_name == s.station_name].iloc[0],
-                               departures_aug, arrivals_aug, available)
-        available = cap
-        if (available < 4).any():
-            percent += 0.05
-            up = True
-            if not last_up:
-                counter += 1
-        elif (available > s.station_capacity - 4).any():
-            percent -= 0.05
-            up = False
-            if last_up:
-                counter += 1
-        else:
-            problematic = False
-            availability.append(int(s.station_capacity * percent))
-        if percent < 0.0:
-            availability.append(0)
-            break
-        elif percent > 1.0:
-            availability.append(s.station_capacity - 1)
-            break
-        if counter >= 4:
-            availability.append(int(s.station_capacity * percent))
-            break
+    print('{0}: {1} (feasible: {2:.2f} to {3:.2f})'.format(s.station_name, availability_optimal[i], lower[i], upper[i]))
+print('{0} of {1} stations can satisfy the average demand.'.format(int((np.ceil(lower) <= np.floor(upper)).sum()), len(stations_aug)))
+print('bikes in the system: {0} (available: {1})'.format(availability_optimal.sum(), stations_aug.station_available.sum()))
+
+# optimal allocations for the demand of each weekday in the records
+departures_weekday, arrivals_weekday = load_hourly_profiles('records.npz', len(stations_aug), by_weekday=True)
+net_change_weekday = arrivals_weekday - departures_weekday
+optimal_weekday = {}
+for day, name in enumerate(WEEKDAYS):
+    if np.isnan(net_change_weekday[day]).any():
+        continue
+    optimal_weekday[name] = optimal_allocation(net_change_weekday[day], capacity, total)
+    stations_aug['station_optimal_' + name] = optimal_weekday[name]
+    lower, upper = feasible_range(net_change_weekday[day], capacity)
+    print('{0}: {1} of {2} stations can satisfy the average demand.'.format(name, int((np.ceil(lower) <= np.floor(upper)).sum()), len(stations_aug)))
+
+# optimal allocations for each simulated day and the day after, which is the goal of the
+# last redistribution
+simulation_weekdays = settings.get('simulation_weekdays', None)
+simulated_days = int(np.ceil((settings['simulation_end_time'] + 1) / 1440.0))
+for day in range(simulated_days + 1):
+    if simulation_weekdays is None:
+        stations_aug['station_optimal_day{0}'.format(day)] = availability_optimal
+        continue
+    name = simulation_weekdays[day % len(simulation_weekdays)]
+    if name not in optimal_weekday:
+        raise ValueError('no records for weekday {0} (available: {1})'.format(name, list(optimal_weekday)))
+    stations_aug['station_optimal_day{0}'.format(day)] = optimal_weekday[name]
 
 # write changes
-stations_aug['station_optimal'] = availability
+stations_aug['station_optimal'] = availability_optimal
+if simulation_weekdays is not None:
+    # the simulation starts with the allocation of its first day
+    stations_aug['station_optimal'] = stations_aug['station_optimal_day0']
 print(stations_aug.head())
 stations_aug.set_index('station_name').to_csv('stations.csv')
-
@@ -3,14 +3,31 @@
 # generated from the (cleaned) historic data by injecting
 # the code into the CARMA model.
 # Generates an experiment file for the simulation.
+# The model and the experiment file are written to `model_dir`,
+# the template `model.carma` stays unchanged. The parameters are
+# also written as arrays (`parameters.npz`) for 4-simulate.py.
 
 
+import functools
+import inspect
 import json
+import os
 import pprint
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.append('..')
+from bss import cache
+from bss.destinations import load_destination_probabilities
+from bss.durations import load_duration_matrix
+from bss.geo import adjacency_lists, nearest_distances, neighbours
+from bss.profiles import load_hourly_profiles
+from bss.records import read_records
+from bss.simulation import padded_lists, write_parameters
+from bss.template import cached_section, carma_list, get_model_dir, render
+
 # load settings from file
 settings = {}
 with open('settings.json', 'r') as file:
@@ -22,6 +39,10 @@ output_dir = settings['output_dir']
 # print additional information?
 verbose = settings['verbose']
 
+# directory for the parametrized model and the experiment file (the template `model.carma` is not modified)
+model_dir = get_model_dir(settings)
+model_path = os.path.join(model_dir, 'model.carma')
+
 #############################################################################################
 ####[ stations ]#############################################################################
 #############################################################################################
@@ -41,99 +62,65 @@ if verbose:
 ####[ tracks ]###############################################################################
 #############################################################################################
 
-# list of tracks recorded during a month (excluding those used for validation)
-dataset = pd.DataFrame()
-
-# load records from csv file
-dataset = pd.read_csv('records.csv', parse_dates=['started_at', 'ended_at'], index_col=0)
+# list of tracks recorded during a month (excluding those used for validation), loaded
+# only when needed, since most sections are read from the cache
+@functools.lru_cache(maxsize=None)
+def get_dataset():
+    return read_records('records.npz', columns=['duration', 'start_station_name', 'end_station_name', 'start_station_id', 'end_station_id'])
 
 if verbose:
     print('--- records ---')
-    print(dataset.head())
+    print(get_dataset().head())
     print('--- ---')
 
 #############################################################################################
 ####[ adjacency for graph ]##################################################################
 #############################################################################################
 
-# returns distance between points in lat/lon in meter using the haversine formula
-# see: https://www.movable-type.co.uk/scripts/latlong.html
-def distance(lon1, lon2, lat1, lat2):
-    R = 6371000; # meters
-    phi1 = np.radians(lat1)
-    phi2 = np.radians(lat2)
-    dphi = np.radians(lat2-lat1)
-    dlamb = np.radians(lon2-lon1)
-    a = np.sin(dphi / 2) * np.sin(dphi / 2) + np.cos(phi1) * np.cos(phi2) * np.sin(dlamb / 2) * np.sin(dlamb / 2)
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
-
-edges = stations.copy().reset_index()
-edges['key'] = 0
-edges = edges.merge(edges, on='key')
-edges = edges.drop(columns=['key'])
-edges['distance'] = distance(edges.station_longitude_x, edges.station_longitude_y, edges.station_latitude_x, edges.station_latitude_y)
-edges = edges[edges.distance > 0]
+# returns the pairs (sources, targets) of different stations that are less than max_distance
+# metres apart, sorted by source and target (see `bss/geo.py`)
+def station_edges(max_distance):
+    sources, targets, distances = neighbours(stations.station_longitude, stations.station_latitude, max_distance)
+    apart = distances > 0
+    return sources[apart], targets[apart]
+
 if verbose:
-    distances = np.arange(0, len(stations))
-    for i, s in stations.iterrows():
-        distances[i] = edges[edges.index_x == i].distance.min()
+    distances = nearest_distances(stations.station_longitude, stations.station_latitude)
     print('mean station distance:')
     print(np.mean(distances))
     print('median station distance:')
     print(np.median(distances))
-edges2 = edges[edges.distance < settings['user_satisfaction_max_distance']].reset_index()
-edges = edges[edges.distance < settings['incentives_max_distance']].reset_index()
-
-fig, ax = plt.subplots(figsize=(20, 10))
-ax.scatter(stations.station_longitude, stations.station_latitude)
-for i, v in edges.iterrows():
-        if v.index_y > v.index_x:
-            if not (v.index_x == v.index_y):
-                ax.plot([v.station_longitude_x, v.station_longitude_y], [v.station_latitude_x, v.station_latitude_y],
-                color='black', alpha=0.1) 
-ax.set_aspect('equal')
-fig.savefig(output_dir + '/stations_graph_parametrization.png')
-
-fig, ax = plt.subplots(figsize=(20, 10))
-ax.scatter(stations.station_longitude, stations.station_latitude)
-for i, v in edges2.iterrows():
-        if v.index_y > v.index_x:
-            if not (v.index_x == v.index_y):
-                ax.plot([v.station_longitude_x, v.station_longitude_y], [v.station_latitude_x, v.station_latitude_y],
-                color='black', alpha=0.1) 
-ax.set_aspect('equal')
-fig.savefig(output_dir + '/users_graph_parametrization.png')
+edges2 = station_edges(settings['user_satisfaction_max_distance'])
+edges = station_edges(settings['incentives_max_distance'])
+
+# plots the stations and the given edges to the file name in the output directory
+def plot_edges(edges, name):
+    fig, ax = plt.subplots(figsize=(20, 10))
+    ax.scatter(stations.station_longitude, stations.station_latitude)
+    lon = stations.station_longitude.values
+    lat = stations.station_latitude.values
+    for x, y in zip(*edges):
+        if y > x:
+            ax.plot([lon[x], lon[y]], [lat[x], lat[y]], color='black', alpha=0.1)
+    ax.set_aspect('equal')
+    fig.savefig(output_dir + '/' + name)
+
+plot_edges(edges, 'stations_graph_parametrization.png')
+plot_edges(edges2, 'users_graph_parametrization.png')
 
 #############################################################################################
 ####[ spawnrates per station ]###############################################################
 #############################################################################################
 
-# list of spawnrate per station per time segment
-spawnrates = dict((s, []) for s in stations.station_name)
-
-by_stations = dataset.groupby('start_station_name')
-filler = pd.DataFrame(index=pd.date_range(dataset.index.min().floor('H'), dataset.index.max().floor('H'), freq="60min"))
-for g in by_stations.groups:
-    f = by_stations.groups[g].to_frame()
-    f = f.resample('60Min').count()
-    f = f.join(filler, how='outer').fillna(0.0)
-    f = f[np.isin(f.index.date, dataset.index.date)]
-    f = f.groupby(f.index.hour).mean()
-    spawnrates[g] = f.started_at / 60.0
-
-def get_s_at_hour(hour):
-    h = 0
-    for s in spawnrates:
-        h += spawnrates[s][spawnrates[s].index == hour]
-    return h
+# spawnrate (departures per minute) per station and hour of the day, shape (stations, 24)
+# (see `bss/profiles.py`)
+departures, arrivals = load_hourly_profiles('records.npz', len(stations))
+spawnrates = departures / 60.0
 
 if verbose:
     print('--- spawnrates ---')
-    users = []
-    for i in range(0, 24):
-        rate = float(get_s_at_hour(i))
-        users.append(rate * 60.0)
+    users = spawnrates.sum(axis=0) * 60.0
+    dataset = get_dataset()
     dep_dayly = dataset.resample('60Min').start_station_name.count()
     dep_dayly = dep_dayly[np.isin(dep_dayly.index.date, dataset.index.date)]
     dep_dayly = dep_dayly.groupby(dep_dayly.index.hour).mean()
@@ -149,37 +136,37 @@ if verbose:
 ####[ destination function ]#################################################################
 #############################################################################################
 
-# function to get the destination probabilities for the given dataset
-def get_transitions(ds):
-    destinations = ds.groupby(['start_station_name', 'end_station_name'])['end_station_name'].count().to_frame()
-    destinations = destinations.rename(columns={'end_station_name': 'count'})
-    destinations = destinations.reset_index()
-    destinations = destinations.set_index('start_station_name')
-    destinations['sum'] = destinations.groupby('start_station_name')['count'].sum()
-    destinations['prob'] = destinations['count'] / destinations['sum']
-    return destinations
-
-destinations = []
-for i in range(0, 24):
-    destinations.append(get_transitions(dataset[dataset.index.hour == i]))
-
-if verbose:
-    print('--- destinations ---')
-    print(destinations[0].head())
-    print('--- ---')
+# returns the destination functions for every hour of the day, with one branch for every
+# start station with observed destinations in that hour
+def destination_functions():
+    # probability of each destination for every hour of the day and start station, as
+    # sparse entries sorted by hour, start and end (see `bss/destinations.py`)
+    dest_hours, dest_starts, dest_ends, dest_probs = load_destination_probabilities('records.npz', len(stations))
+    if verbose:
+        print('--- destinations ---')
+        print(pd.DataFrame({'hour': dest_hours, 'start': dest_starts, 'end': dest_ends, 'prob': dest_probs}).head())
+        print('--- ---')
+    branches = [[] for period in range(0, 24)]
+    bounds = np.flatnonzero(np.diff(dest_hours * len(stations) + dest_starts)) + 1
+    for entries in np.split(np.arange(len(dest_hours)), bounds):
+        if len(entries) == 0:
+            continue
+        sid = dest_starts[entries[0]]
+        choices = ', '.join('{0}:{1:.2}'.format(end, float(prob)) for end, prob in zip(dest_ends[entries], dest_probs[entries]))
+        branches[dest_hours[entries[0]]].append('if (sid == {0}) // {1}\n    return selectFrom({2});\nelse '.format(sid, stations.station_name[sid], choices))
+    return ''.join('\nfun int dest_{0}(int sid){{'.format(period) + ''.join(branches[period]) + '\n    return -1;}\n' for period in range(0, 24))
 
 #############################################################################################
 ####[ trip durations ]#######################################################################
 #############################################################################################
 
-durations = dataset.groupby(['start_station_name', 'end_station_name'])['duration'].mean().to_frame()
-durations['duration'] /= 60.0
-
-average_duration = dataset['duration'].mean() / 60.0
+# average duration in minutes for the trips between each pair of stations [start][end],
+# the average of all trips for pairs without trips (see `bss/durations.py`)
+durations = load_duration_matrix('records.npz', len(stations)) / 60.0
 
 if verbose:
     print('--- durations ---')
-    print(durations.head(25))
+    print(durations[:5, :5])
     print('--- ---')
 
 #############################################################################################
@@ -189,238 +176,171 @@ if verbose:
 if verbose:
     print('--- injecting parameters ---')
 
-# returns sid for a given station name
-def indexOf(station_name):
-    for i, s in enumerate(stations['station_name']):
-        if s == station_name:
-            return i
-    return -1
-
-# replaces the part of text between index start and end with substitution
-def replace(start, end, text, substitution):
-    return text[:start] + substitution + text[end:]
+# returns the definition of a list of adjacency lists
+def adjacency_section(name, adjacency):
+    lists = [carma_list(adjacent) if len(adjacent) > 0 else 'newList(int)' for adjacent in adjacency]
+    return 'const {0} = {1};\n'.format(name, carma_list(lists))
 
-# the text contents of the model file
-modelfile = ''
-
-# load model file
-with open('model.carma', 'r') as model:
-    modelfile = model.read()
+# returns the definition of a table with one row per station, preceded by the name of the station
+def station_table(name, rows, prefix='[:'):
+    rows = ['// {0}\n{1}{2}:]'.format(station, prefix, ', '.join(row)) for station, row in zip(stations.station_name, rows)]
+    return 'const {0} = [:\n{1}:];\n'.format(name, ',\n'.join(rows))
 
 avail_field = 'station_optimal' if settings['use_optimals'] else 'station_available'
 
+# hashes of the inputs of the sections: the code that builds them (this script and the
+# bss modules it uses) and the data
+generator_hash = cache.make_key([cache.file_hash(path) for path in [__file__] + [inspect.getfile(function) for function in
+    [load_destination_probabilities, load_duration_matrix, adjacency_lists, load_hourly_profiles, read_records, cached_section]]])
+stations_hash = cache.file_hash('stations.csv')
+records_hash = cache.file_hash('records.npz')
+
+# returns the contents of section name, built by build. Sections that depend on the data are
+# cached by the hashes of the data and the settings with the given keys, so in a sweep over
+# settings like the incentives only the sections whose inputs changed are built again.
+# If refresh is True, the section is built again even if it is cached.
+def section(name, build, data, keys=(), refresh=False):
+    return cached_section(name, [generator_hash, data, dict((key, settings.get(key)) for key in keys)], build, refresh)
+
+# returns the goal of available bikes for the beginning of each simulated day and the
+# day after, shape (days, stations) (see 2-calc_optimals.py)
+def goal_days():
+    if 'station_optimal' not in stations.columns:
+        return np.zeros((0, len(stations)), dtype=int)
+    simulated_days = int(np.ceil((settings['simulation_end_time'] + 1) / 1440.0))
+    goals_days = []
+    for day in range(simulated_days + 1):
+        day_field = 'station_optimal_day{0}'.format(day)
+        if day_field not in stations.columns:
+            day_field = 'station_optimal'
+        goals_days.append(stations[day_field].astype(int).values)
+    return np.array(goals_days)
+
+# returns the goal of available bikes for each station and for the beginning of each
+# simulated day and the day after
+def goal_tables():
+    goals = []
+    if 'station_optimal' in stations.columns:
+        goals = stations.station_optimal.astype(int)
+    goals_days = [carma_list(goals_day) for goals_day in goal_days()]
+    return 'const available_goal = {0};\nconst available_goal_days = {1};\n'.format(carma_list(goals), carma_list(goals_days))
+
+# the contents of each section of the model
+sections = {}
+
 # average walking time
-walking_start = modelfile.find('// WALKTIME START')
-walking_end = modelfile.find('// WALKTIME END')
-walkingstr = '// WALKTIME START\nconst walk_time = {0};\n'.format(1.0 / float(settings['average_walk_time']))
-modelfile = replace(walking_start, walking_end, modelfile, walkingstr)
+sections['WALKTIME'] = 'const walk_time = {0};\n'.format(1.0 / float(settings['average_walk_time']))
 
 # user cooperation factor
-coop_start = modelfile.find('// COOP START')
-coop_end = modelfile.find('// COOP END')
 c_factor = float(settings['cooperation'])
-coopstr = '// COOP START\n'
 if c_factor == 0.0:
-    coopstr += 'return false;'
+    sections['COOP'] = 'return false;\n'
 elif c_factor == 1.0:
-    coopstr += 'return true;'
+    sections['COOP'] = 'return true;\n'
 else:
-    coopstr += 'return (selectFrom(0:{0}, 1:{1}) == 0);'.format(c_factor, 1.0 - c_factor)
-coopstr += '\n'
-modelfile = replace(coop_start, coop_end, modelfile, coopstr)
+    sections['COOP'] = 'return (selectFrom(0:{0}, 1:{1}) == 0);\n'.format(c_factor, 1.0 - c_factor)
 
 # redistribution truck
-truck_start = modelfile.find('// TRUCK START')
-truck_end = modelfile.find('// TRUCK END')
-truckstr = '// TRUCK START\n'
 if settings["use_truck"]:
-    truckstr += '''
+    sections['TRUCK'] = '''
                 int time = int(floor(now));
-                real difference =  (abs(available_goal[sender.sid] - global.is_avail[sender.sid]) > 0 ? 1.0 : 0.0);
+                real difference =  (abs(goal(sender.sid, now) - global.is_avail[sender.sid]) > 0 ? 1.0 : 0.0);
                 if ((time >= 1380 && time <= 1439) || (time >= 2810 && time <= 2879) || (time >= 4240 && time <= 4319)){
                 	return 500.0 * difference;
                 } else {
                 	return 0.0;
                 }
+
 '''
 else:
-    truckstr += 'return 0.0;'
-truckstr += '\n'
-modelfile = replace(truck_start, truck_end, modelfile, truckstr)
+    sections['TRUCK'] = 'return 0.0;\n'
 
-# user cooperation factor
-inc_start = modelfile.find('// INC START')
-inc_end = modelfile.find('// INC END')
+# incentive strategy
 strategy = settings['incentives']
-incstr = '// INC START\n'
 if strategy == 'both':
-    incstr += 'new User(orig_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_retrievals), dest_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_returns));'
+    sections['INC'] = 'new User(orig_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_retrievals), dest_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_returns));\n'
 elif strategy == 'get':
-    incstr += 'new User(orig_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_retrievals), dest(sender.sid, int(floor(now / 60.0)) % 24));'
+    sections['INC'] = 'new User(orig_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_retrievals), dest(sender.sid, int(floor(now / 60.0)) % 24));\n'
 elif strategy == 'ret':
-    incstr += 'new User(sender.sid, dest_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_returns));'
+    sections['INC'] = 'new User(sender.sid, dest_incentivized(sender.sid, now, global.is_avail, global.will_return, global.inc_returns));\n'
 else:
-    incstr += 'new User(sender.sid, dest(sender.sid, int(floor(now / 60.0)) % 24));'
-incstr += '\n'
-modelfile = replace(inc_start, inc_end, modelfile, incstr)
+    sections['INC'] = 'new User(sender.sid, dest(sender.sid, int(floor(now / 60.0)) % 24));\n'
 
 # adjacency for each station
-adj_start = modelfile.find('// ADJACENCY START')
-adj_end = modelfile.find('// ADJACENCY END')
-adjstr = '// ADJACENCY START\nconst zone_adjacency = [:'
-for i, s in stations.iterrows():
-    adjacent = edges[edges.station_name_x == s.station_name].index_y.to_numpy()
-    if len(adjacent) > 0:
-        adjstr += '[:'
-        for a in adjacent:
-            adjstr += '{0}, '.format(a)
-        adjstr = adjstr[:-2]
-        adjstr += ':], '
-    else:
-        adjstr += 'newList(int), '
-adjstr = adjstr[:-2]
-adjstr += ':];\n'
-modelfile = replace(adj_start, adj_end, modelfile, adjstr)
+sections['ADJACENCY'] = section('ADJACENCY', lambda: adjacency_section('zone_adjacency', adjacency_lists(*edges, len(stations))),
+    [stations_hash], ['incentives_max_distance'])
 
 # adjacency for each station 2
-adj_start = modelfile.find('// ADJACENCY2 START')
-adj_end = modelfile.find('// ADJACENCY2 END')
-adjstr = '// ADJACENCY2 START\nconst zone_adjacency_2 = [:'
-for i, s in stations.iterrows():
-    adjacent = edges2[edges2.station_name_x == s.station_name].index_y.to_numpy()
-    if len(adjacent) > 0:
-        adjstr += '[:'
-        for a in adjacent:
-            adjstr += '{0}, '.format(a)
-        adjstr = adjstr[:-2]
-        adjstr += ':], '
-    else:
-        adjstr += 'newList(int), '
-adjstr = adjstr[:-2]
-adjstr += ':];\n'
-modelfile = replace(adj_start, adj_end, modelfile, adjstr)
+sections['ADJACENCY2'] = section('ADJACENCY2', lambda: adjacency_section('zone_adjacency_2', adjacency_lists(*edges2, len(stations))),
+    [stations_hash], ['user_satisfaction_max_distance'])
 
 # capacity for each station
-cap_start = modelfile.find('// CAPACITIES START')
-cap_end = modelfile.find('// CAPACITIES END')
-capstr = '// CAPACITIES START\nconst capacity = [:'
-for i, s in stations.iterrows():
-    capstr += '{0}, '.format(int(s.station_capacity))
-capstr = capstr[:-2]
-capstr += ':];\n'
-modelfile = replace(cap_start, cap_end, modelfile, capstr)
+sections['CAPACITIES'] = section('CAPACITIES', lambda: 'const capacity = {0};\n'.format(carma_list(stations.station_capacity.astype(int))),
+    [stations_hash])
 
 # available bikes for each station
-avail_start = modelfile.find('// AVAIL START')
-avail_end = modelfile.find('// AVAIL END')
-availstr = '// AVAIL START\nattrib is_avail := [:'
-for i, s in stations.iterrows():
-    availstr += '{0}, '.format(int(s[avail_field]))
-availstr = availstr[:-2]
-availstr += ':];\n'
-modelfile = replace(avail_start, avail_end, modelfile, availstr)
+sections['AVAIL'] = section('AVAIL', lambda: 'attrib is_avail := {0};\n'.format(carma_list(stations[avail_field].astype(int))),
+    [stations_hash], ['use_optimals'])
 
 # goal of available bikes for each station
-
-avail_start = modelfile.find('// GOAL START')
-avail_end = modelfile.find('// GOAL END')
-availstr = '// GOAL START\nconst available_goal = [:'
-if 'station_optimal' in stations.columns:
-    for i, s in stations.iterrows():
-        availstr += '{0}, '.format(int(s.station_optimal))
-    availstr = availstr[:-2]
-availstr += ':];\n'
-modelfile = replace(avail_start, avail_end, modelfile, availstr)
+sections['GOAL'] = section('GOAL', goal_tables, [stations_hash], ['simulation_end_time'])
 
 # returns matrix
-return_start = modelfile.find('// RETURN START')
-return_end = modelfile.find('// RETURN END')
-returnstr = '// RETURN START\nattrib will_return := [:'
-for i in range(0, 74):
-    returnstr += '[: {0} :], '.format(('0,' * len(stations))[:-1])
-returnstr = returnstr[:-2]
-returnstr += ':];\n'
-modelfile = replace(return_start, return_end, modelfile, returnstr)
+no_returns = '[: {0} :]'.format(','.join(['0'] * len(stations)))
+sections['RETURN'] = 'attrib will_return := {0};\n'.format(carma_list([no_returns] * 74))
 
 # durations
-duration_start = modelfile.find('// DUR START')
-duration_end = modelfile.find('// DUR END')
-durationstr = '// DUR START\nconst dur = [:\n'
-for i, s in stations.iterrows():
-    durationstr += '// {0}\n'.format(s['station_name'])
-    durationstr += '[: '
-    for i2, s2 in stations.iterrows():
-        dur = durations[(durations.index.get_level_values(0) == s['station_name']) & (durations.index.get_level_values(1) == s2['station_name'])]
-        if len(dur) > 0:
-            dur = round(float(dur['duration']), 2)
-        else:
-            dur = average_duration#0.0
-        durationstr += '{0}, '.format(dur)
-    durationstr = durationstr[:-2]
-    durationstr += ':],\n'
-durationstr = durationstr[:-2]
-durationstr += ':];\n'
-modelfile = replace(duration_start, duration_end, modelfile, durationstr)
+sections['DUR'] = section('DUR', lambda: station_table('dur', [['{0}'.format(round(float(dur), 2)) for dur in row] for row in durations], prefix='[: '),
+    [stations_hash, records_hash])
 
 # stations
-stations_start = modelfile.find('// STATIONS START')
-stations_end = modelfile.find('// STATIONS END')
-stationstr = ''
-counter = 0
-for i, s in stations.iterrows():
-    stationstr += 'new Station({0}, {1}, {2}); //{3}\n'.format(counter, int(s['station_capacity']), int(s[avail_field]), s['station_name'])
-    stationstr += 'new Spawner({0});\n'.format(counter)
-    counter += 1
-modelfile = replace(stations_start, stations_end, modelfile, '// STATIONS START\n' + stationstr)
-
-if settings['refresh_destinations']:
-    # destination function
-    destinations_start = modelfile.find('// DEST START')
-    destinations_end = modelfile.find('// DEST END')
-    destinationsstr = '// DEST START\n'
-    count = 0
-    for period in range(0, 24):
-        destinationsstr += '\nfun int dest_{0}(int sid){{'.format(period)
-        destination = destinations[period]
-        for i, s in stations.iterrows():
-            dest = destination[(destination.index == s['station_name'])]
-            if len(dest) > 0:
-                destinationsstr += 'if (sid == {0}) // {1}\n    return selectFrom('.format(count, s['station_name'])
-                for i2, s2 in stations.iterrows():
-                    dest = destination[(destination.index == s['station_name']) & (destination['end_station_name'] == s2['station_name'])]
-                    if len(dest) > 0:
-                        destinationsstr += '{0}:{1:.2}, '.format(i2, float(dest['prob']))
-                destinationsstr = destinationsstr[:-2]
-                destinationsstr += ');\nelse '
-            count += 1
-        destinationsstr += '\n    return -1;}\n'
-        count = 0
-    modelfile = replace(destinations_start, destinations_end, modelfile, destinationsstr)
+sections['STATIONS'] = section('STATIONS', lambda: ''.join('new Station({0}, {1}, {2}); //{3}\nnew Spawner({0});\n'.format(i, int(s['station_capacity']), int(s[avail_field]), s['station_name'])
+    for i, s in stations.iterrows()), [stations_hash], ['use_optimals'])
+
+# destination function (cached like the other sections, refresh_destinations forces a rebuild)
+sections['DEST'] = section('DEST', destination_functions, [stations_hash, records_hash], refresh=settings.get('refresh_destinations', False))
 
 # spawnrates
-spawnrates_start = modelfile.find('// SPAWNRATE START')
-spawnrates_end = modelfile.find('// SPAWNRATE END')
-spawnratestr1 = '// SPAWNRATE START\nconst demand = [:\n'
-for i, s in stations.iterrows():
-    spawnratestr1 += '// {0}\n'.format(s['station_name'])
-    spawnratestr1 += '[:'
-    for j in range(0, 24):
-        rate = round(spawnrates[s['station_name']][j], 4)
-        spawnratestr1 += '{0}, '.format(rate)
-    spawnratestr1 = spawnratestr1[:-2]
-    spawnratestr1 += ':],\n'
-spawnratestr1 = spawnratestr1[:-2]
-spawnratestr1 += ':];\n'
-modelfile = replace(spawnrates_start, spawnrates_end, modelfile, spawnratestr1)
-
-# save parametrized model file
-with open('model.carma', 'w') as model:
-    model.write(modelfile)
-
-if verbose:     
+sections['SPAWNRATE'] = section('SPAWNRATE', lambda: station_table('demand', [['{0}'.format(round(rate, 4)) for rate in row] for row in spawnrates]),
+    [stations_hash, records_hash])
+
+# load the model template and save the parametrized model to the model directory
+with open('model.carma', 'r') as model:
+    template = model.read()
+
+os.makedirs(model_dir, exist_ok=True)
+with open(model_path, 'w') as model:
+    model.write(render(template, sections))
+
+if verbose:
+    print('model written to {0}'.format(model_path))
     print('done.')
     print('--- ---')
 
+#############################################################################################
+####[ parameters as arrays ]#################################################################
+#############################################################################################
+
+# the same parameters (rounded like in the model) as arrays, for the simulation of the
+# model with numpy (see `bss/simulation.py`)
+dest_hours, dest_starts, dest_ends, dest_probs = load_destination_probabilities('records.npz', len(stations))
+write_parameters(os.path.join(model_dir, 'parameters.npz'),
+    capacity=stations.station_capacity.astype(int).values,
+    available=stations[avail_field].astype(int).values,
+    goal_days=goal_days(),
+    demand=np.round(spawnrates, 4),
+    dur=np.round(durations, 2),
+    dest_hours=dest_hours,
+    dest_starts=dest_starts,
+    dest_ends=dest_ends,
+    dest_probabilities=np.array([float('{0:.2}'.format(prob)) for prob in dest_probs]),
+    adjacency=padded_lists(adjacency_lists(*edges, len(stations))),
+    adjacency2=padded_lists(adjacency_lists(*edges2, len(stations))),
+    walk_time=1.0 / float(settings['average_walk_time']),
+    cooperation=c_factor,
+    use_truck=bool(settings['use_truck']),
+    incentives=strategy)
+
 #############################################################################################
 ####[ Generate Experiment File ]#############################################################
 #############################################################################################
@@ -430,7 +350,7 @@ if verbose:
 
 experimentstr = '''
 test_exp
-model.carma
+{3}
 TestScenario
 {0}
 {1}
@@ -456,13 +376,13 @@ DissatisfiedGet: level=0
 DissatisfiedGet: level=1
 DissatisfiedGet: level=2
 DissatisfiedGet: level=3
-'''.format(settings['replications'], settings['simulation_end_time'], settings['samples'])
+'''.format(settings['replications'], settings['simulation_end_time'], settings['samples'], model_path)
 
 # add bike availability for each station to the recorded measures
 for i in range(len(stations)):
     experimentstr += 'Available: sid={0}\n'.format(i)
 
-with open('experiment.exp', 'w+') as file:
+with open(os.path.join(model_dir, 'experiment.exp'), 'w+') as file:
     file.write(experimentstr)
 
 if verbose:
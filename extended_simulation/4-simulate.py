@@ -0,0 +1,42 @@
+# Simulates the parametrized model with numpy instead of MyCLI.jar (see
+# `bss/simulation.py`) and writes the trajectories to Traces/ and the results
+# of the measures to Results/ in the same formats.
+
+import json
+import os
+import sys
+import time
+
+sys.path.append('..')
+from bss.simulation import read_parameters, simulate, write_results
+from bss.template import get_model_dir
+
+# (the worker processes import this file, so only the main process simulates)
+if __name__ == '__main__':
+    # load settings from file
+    settings = {}
+    with open('settings.json', 'r') as file:
+        settings = json.loads(file.read())
+
+    # parameters written by 3-parametrize.py
+    parameters = read_parameters(os.path.join(get_model_dir(settings), 'parameters.npz'))
+    print('Loaded parameters.')
+    print('\t#stations: {0}'.format(len(parameters['capacity'])))
+
+    for directory in ['Traces', 'Results']:
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+
+    # approximate the replications with tau-leaping if a step is given
+    tau = settings.get('tau_step', None)
+    if tau is not None:
+        print('Using tau-leaping with steps of {0} minutes.'.format(tau))
+    print('Starting simulation with {0} processes...'.format(settings['nthreads']))
+    start = time.time()
+    statistics = simulate(parameters, settings['replications'], settings['simulation_end_time'], settings['samples'],
+                          settings['simulation_seed'], os.path.join('Traces', 'Traj'), settings.get('trace_format', 'csv'),
+                          batch_size=settings.get('simulation_batch_size', None), processes=settings['nthreads'],
+                          tau=tau)
+    print('Producing global results ...')
+    write_results('Results', statistics, settings['simulation_end_time'], settings['samples'])
+    print('elapsed time: {0}s'.format(time.time() - start))
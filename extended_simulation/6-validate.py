@@ -17,44 +17,20 @@ import os
 import pprint
 import statistics
 import math
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+sys.path.append('..')
+from bss.profiles import availability, load_hourly_profiles
+from bss.records import read_records
+
 #############################################################################################
 ####[ helper functions ]#####################################################################
 #############################################################################################
 
-# returns the history of the number of available bikes for the given station
-def get_availability(station, departure_frame, arrival_frame):
-
-    filler = pd.DataFrame(index=pd.date_range(departure_frame.index.min().floor('H'), departure_frame.index.max().floor('H'), freq="60min"))
-    filler = filler[np.isin(filler.index.date, departure_frame.index.date)] # departure_frame for both because of possible endings in unwanted (validation) days
-
-    dep_dayly = departure_frame[departure_frame['start_station_name'] == station.station_name]
-    dep_dayly = dep_dayly.resample('60Min').count()
-    dep_dayly = dep_dayly.join(filler, how='right').fillna(0.0)
-    dep_dayly = dep_dayly.groupby(dep_dayly.index.hour).mean()
-    dep_dayly = dep_dayly.rename(columns={'start_station_name': 'departures'})
-
-    arr_dayly = arrival_frame[(arrival_frame['end_station_name'] == station.station_name) & ~(arrival_frame.index.date != departure_frame.index.date)]
-    arr_dayly = arr_dayly.resample('60Min').count()
-    arr_dayly = arr_dayly.join(filler, how='right').fillna(0.0)
-    arr_dayly = arr_dayly.groupby(arr_dayly.index.hour).mean()
-    arr_dayly = arr_dayly.rename(columns={'end_station_name': 'arrivals'})
-
-    change = arr_dayly['arrivals'] - dep_dayly['departures']
-    start = station.station_available
-    cap = []
-    for i in range(0, simulation_hours):
-        if i == 0:
-            cap.append(float(start) + change[i])
-        else:
-            cap.append(cap[i - 1] + change[i])
-    cap = np.array(cap)
-    return cap
-
 # returns the history of the variance of the number of available bikes for the given station
 def get_availability_variance(station, departure_frame, arrival_frame):
 
@@ -108,15 +84,19 @@ if verbose:
     print('--- loading data ---')
 
 # read datasets
-dataset_validation = pd.read_csv('records_validation.csv', index_col=0, parse_dates=['started_at', 'ended_at'])
-dataset_training = pd.read_csv('records.csv', index_col=0, parse_dates=['started_at', 'ended_at'])
+dataset_validation = read_records('records_validation.npz', columns=['ended_at', 'start_station_name'])
+dataset_training = read_records('records.npz', columns=['ended_at', 'start_station_name'])
 stations = pd.read_csv('stations.csv')
 
 # read arrivals and departures from files for validation and training data
-departure_data = pd.read_csv('records_validation.csv', usecols=['started_at', 'start_station_name'], parse_dates=['started_at'], index_col=0)
-arrival_data = pd.read_csv('records_validation.csv', usecols=['ended_at', 'end_station_name'], parse_dates=['ended_at'], index_col=0)
-departure_data_training = pd.read_csv('records.csv', usecols=['started_at', 'start_station_name'], parse_dates=['started_at'], index_col=0)
-arrival_data_training = pd.read_csv('records.csv', usecols=['ended_at', 'end_station_name'], parse_dates=['ended_at'], index_col=0)
+departure_data = read_records('records_validation.npz', columns=['start_station_name'], index='started_at')
+arrival_data = read_records('records_validation.npz', columns=['end_station_name'], index='ended_at')
+departure_data_training = read_records('records.npz', columns=['start_station_name'], index='started_at')
+arrival_data_training = read_records('records.npz', columns=['end_station_name'], index='ended_at')
+
+# average number of departures and arrivals per station and hour of the day for validation and training data
+departures_validation, arrivals_validation = load_hourly_profiles('records_validation.npz', len(stations))
+departures_training, arrivals_training = load_hourly_profiles('records.npz', len(stations))
 
 # get the directory containing the results
 results_dir = 'Results'
@@ -157,11 +137,11 @@ for index, s in stations.iterrows():
     confidence_simulation = get_confidence_interval(availability_simulation)
 
     # get data from historic dataset for validation
-    availability_validation = get_availability(s, departure_data, arrival_data)
+    availability_validation = availability(s.station_available, arrivals_validation[index] - departures_validation[index])
     availability_variance_validation = get_availability_variance(s, departure_data, arrival_data)
 
     # get data from historic dataset
-    availability_training = get_availability(s, departure_data_training, arrival_data_training)
+    availability_training = availability(s.station_available, arrivals_training[index] - departures_training[index])
     availability_variance_training = get_availability_variance(s, departure_data_training, arrival_data_training)
     
     '''
@@ -0,0 +1,62 @@
+# Evaluates the SSTL formulas on the trajectories in Traces/ without jSSTL (see
+# `bss/sstl.py`) and writes the results to Formulas/ in the same format as jSSTLEvalMulti.jar.
+
+import functools
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append('..')
+from bss.graph import read_distances
+from bss.smc import converged, sprt
+from bss.sstl import evaluate_trajectories, write_formula
+
+# (the worker processes import this file, so only the main process evaluates)
+if __name__ == '__main__':
+    # load settings from file
+    settings = {}
+    with open('settings.json', 'r') as file:
+        settings = json.loads(file.read())
+
+    # shortest distances between the stations, written by 7-generate_graph.py
+    distances = read_distances('model.dist')
+    print('Loaded graph.')
+    print('\t#locations: {0}'.format(len(distances)))
+
+    # sequential statistical model checking: stop as soon as all estimates are precise
+    # enough (see `bss/smc.py`), otherwise all trajectories are evaluated
+    confidence = settings.get('smc_confidence', 0.95)
+    threshold = settings.get('smc_threshold', None)
+    indifference = settings.get('smc_indifference', 0.01)
+    stop = None
+    if settings.get('smc_width', None) is not None or threshold is not None:
+        stop = functools.partial(converged, width=settings.get('smc_width', None), confidence=confidence,
+                                 interval=settings.get('smc_interval', 'wilson'), threshold=threshold, indifference=indifference)
+
+    print('Start checking.')
+    start = time.time()
+    # the trajectories are distributed over as many processes as used for the simulation
+    statistics = evaluate_trajectories('Traces/Traj', settings['replications'], distances,
+                                       batch_size=settings.get('smc_batch_size', 50), processes=settings['nthreads'], stop=stop)
+    evaluated = next(iter(statistics.values()))['n']
+    print('End checking.')
+    print('Total time for checking: {0}s'.format(time.time() - start))
+    print('Evaluated trajectories: {0} of {1}'.format(evaluated, settings['replications']))
+
+    if not os.path.exists('Formulas'):
+        os.mkdir('Formulas')
+    for formula, formula_statistics in statistics.items():
+        write_formula(os.path.join('Formulas', formula + '.csv'), formula_statistics)
+    with open(os.path.join('Formulas', 'evaluation.json'), 'w') as file:
+        json.dump({'evaluated': evaluated, 'simulated': settings['replications']}, file, indent=4)
+    # decisions of the SPRT: 1 above, -1 below the threshold, 0 undecided
+    if threshold is not None:
+        if not os.path.exists(os.path.join('Formulas', 'sprt')):
+            os.mkdir(os.path.join('Formulas', 'sprt'))
+        for formula, formula_statistics in statistics.items():
+            decisions = sprt(formula_statistics['sum'], evaluated, threshold, indifference, confidence)
+            parameters, locations = np.indices(decisions.shape)
+            np.savetxt(os.path.join('Formulas', 'sprt', formula + '.csv'),
+                       np.column_stack([parameters.ravel(), locations.ravel(), decisions.ravel()]), fmt='%d', delimiter=',')
@@ -19,7 +19,7 @@ stations = pd.read_csv('stations.csv')
 
 results_dir = 'Formulas'
 
-results = os.listdir(results_dir)
+results = [r for r in os.listdir(results_dir) if r.endswith('.csv')]
 
 dist_pics = []
 dist_selection = [1, 6, 10]
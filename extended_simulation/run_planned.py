@@ -1,13 +1,25 @@
 #@author: justinnk
-# runs all the experiments specified in plan.json
+# runs all the experiments specified in plan.json, as many at once as fit into the
+# cores and memory (in GB) of the machine or the budget given on the command line:
+#
+#     python3 run_planned.py [cores] [memory]
+#
+# Every experiment runs in its own working directory (see `bss/planner.py`).
 
 import os
 import json
+import sys
+
+sys.path.append('..')
+from bss.planner import run_plan
 
 plan = []
 with open('plan.json', 'r') as file:
     plan = json.load(file)
 
+cores = int(sys.argv[1]) if len(sys.argv) > 1 else None
+memory = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
 for exp in plan:
     name = exp['name']
     output_folder = os.path.join('Planned_Experiments', name)
@@ -17,17 +29,11 @@ for exp in plan:
         os.mkdir(os.path.join(output_folder, 'formulas'))
     with open(os.path.join(output_folder, 'settings.json'), 'w+') as file:
         file.write(json.dumps(exp, indent=4))
-    with open('settings.json', 'w') as file:
-        file.write(json.dumps(exp, indent=4))
-    if exp['needs_cleaning']:
-        print('starting experiment "{0}", outputting to "{1}"'.format(name, output_folder))
-        os.system('python3 run_simulation.py 2>&1 | tee {0}'.format(os.path.join(output_folder, 'out.txt')))
-        os.system(' cp -avr Formulas/ {0}/'.format(output_folder))
-        print('finished.')
-    else:
-        print('starting experiment "{0}", outputting to "{1}"'.format(name, output_folder))
-        print('omitting cleaning')
-        os.system('python3 run_simulation_no_cleaning.py 2>&1 | tee {0}'.format(os.path.join(output_folder, 'out.txt')))
-        os.system(' cp -avr Formulas/ {0}/'.format(output_folder))
-        print('finished.')
-    
\ No newline at end of file
+    if not exp['needs_cleaning']:
+        print('experiment "{0}" omits cleaning'.format(name))
+
+failed = run_plan(plan, '.', cores, memory)
+if failed:
+    print('failed experiments: {0}'.format(', '.join(failed)))
+    sys.exit(1)
+print('finished.')
@@ -2,9 +2,13 @@
 # This notebook will add latent demand to the trips. It is assumed that the phenomenon of censored demand occurs when a station is empty for at least one hour. To recreate the information about the missing trips, new trips are added randomly based on the average behaviour during the same period at other days, but only when the station was not empty. The seed used for our study is 12.
 
 #%%
+import sys
 import numpy as np
 import pandas as pd
 
+sys.path.append('..')
+from bss.durations import duration_matrix
+
 seed = 12
 np.random.seed(seed)
 
@@ -26,6 +30,17 @@ trips_set = pd.read_csv('../data/trips_08-2019.csv', usecols=['started_at', 'end
                         'end_station_name', 'duration'], parse_dates=['started_at', 'ended_at'], index_col='started_at')
 trips_set.index = trips_set.index.map(lambda x: x.round('H'))
 
+#%% [markdown]
+# Average duration of the trips between each pair of stations in seconds (`durations[start][end]`). Pairs without trips get the average duration of all trips (see `bss/durations.py`). Trips from or to stations that are not in the station list are averaged separately (`other_durations`).
+
+#%%
+station_ids = pd.Series(np.arange(len(stations)), index=stations.station_name)
+trips_set['start_station_id'] = trips_set.start_station_name.map(station_ids).fillna(-1).astype(int)
+trips_set['end_station_id'] = trips_set.end_station_name.map(station_ids).fillna(-1).astype(int)
+durations = duration_matrix(trips_set, len(stations))
+other_trips = trips_set[(trips_set.start_station_id < 0) | (trips_set.end_station_id < 0)]
+other_durations = other_trips.groupby(['start_station_name', 'end_station_name']).duration.mean()
+
 #%% [markdown]
 # The dataset with the additional trips.
 
@@ -85,12 +100,12 @@ def generate_trip(hour, start_station):
     else:
         end_station_name = end_station_name[0]
     # calculate duration
-    duration = trips_set[trips_set.start_station_name == start_station].groupby('end_station_name').duration.mean()
-    duration = duration[duration.index == end_station_name]
-    if len(duration) <= 0:
-        duration = trips_set.duration.mean()
+    if start_station in station_ids.index and end_station_name in station_ids.index:
+        duration = durations[station_ids[start_station], station_ids[end_station_name]]
+    elif (start_station, end_station_name) in other_durations.index:
+        duration = other_durations[(start_station, end_station_name)]
     else:
-        duration = duration.values[0]
+        duration = trips_set.duration.mean()
     # calculate ending time
     ended_at = started_at + pd.to_timedelta(duration, unit='s')
     return {
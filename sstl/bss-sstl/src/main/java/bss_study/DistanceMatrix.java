@@ -0,0 +1,93 @@
+/**
+ * This file contains the code needed to load the precomputed
+ * distance matrix of a graph (shortest distances between all
+ * locations) instead of computing it with the Floyd-Warshall
+ * algorithm of jSSTL. The matrix is written by the graph
+ * generation scripts next to the graph (model.dist) in the
+ * following binary format (little endian):
+ *
+ * magic bytes "BSSDIST1" (8 bytes)
+ * number of locations n (int64)
+ * sha256 of the graph file (32 bytes)
+ * n x n distances (float64, row-major, infinity for locations
+ *   that are not connected)
+ *
+ * The matrix is only used if it belongs to the graph file
+ * (same hash) and has the same number of locations as the graph.
+ *
+ */
+
+package bss_study;
+import java.io.File;
+import java.io.IOException;
+import java.io.RandomAccessFile;
+import java.lang.reflect.Field;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.DoubleBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
+import java.util.Arrays;
+
+import eu.quanticol.jsstl.core.space.GraphModel;
+
+public class DistanceMatrix {
+
+	private static final byte[] MAGIC = "BSSDIST1".getBytes(StandardCharsets.US_ASCII);
+	private static final int HEADER_SIZE = 48;
+
+	/**
+	 * Sets the distance matrix of the graph to the matrix in the given file.
+	 *
+	 * @param graph The graph read from graphPath.
+	 * @param path The file containing the distance matrix.
+	 * @param graphPath The file the graph was read from.
+	 * @return true if the matrix was loaded, false if the file is missing or
+	 * does not belong to the graph (the matrix has to be computed then).
+	 */
+	public static boolean load(GraphModel graph, String path, String graphPath) {
+		int n = graph.getNumberOfLocations();
+		File file = new File(path);
+		if (!file.exists() || file.length() != HEADER_SIZE + 8L * n * n) {
+			return false;
+		}
+		try (RandomAccessFile raf = new RandomAccessFile(file, "r"); FileChannel channel = raf.getChannel()) {
+			ByteBuffer buffer = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size()).order(ByteOrder.LITTLE_ENDIAN);
+			// check the header
+			byte[] magic = new byte[8];
+			buffer.get(magic);
+			if (!Arrays.equals(magic, MAGIC) || buffer.getLong() != n) {
+				return false;
+			}
+			byte[] hash = new byte[32];
+			buffer.get(hash);
+			if (!Arrays.equals(hash, graphHash(graphPath))) {
+				return false;
+			}
+			// read the distances row by row
+			DoubleBuffer distances = buffer.asDoubleBuffer();
+			double[][] dM = new double[n][n];
+			for (int i = 0; i < n; i++) {
+				distances.get(dM[i]);
+			}
+			Field field = GraphModel.class.getDeclaredField("dM");
+			field.setAccessible(true);
+			field.set(graph, dM);
+			return true;
+		} catch (IOException | ReflectiveOperationException | NoSuchAlgorithmException | RuntimeException e) {
+			System.out.println("Could not load distance matrix from " + path + ": " + e);
+			return false;
+		}
+	}
+
+	/**
+	 * Computes the sha256 hash of the graph file.
+	 */
+	private static byte[] graphHash(String graphPath) throws IOException, NoSuchAlgorithmException {
+		return MessageDigest.getInstance("SHA-256").digest(Files.readAllBytes(Paths.get(graphPath)));
+	}
+}
@@ -16,15 +16,23 @@
 package bss_study.multiday;
 import java.io.BufferedReader;
 import java.io.BufferedWriter;
+import java.io.File;
 import java.io.FileReader;
 import java.io.IOException;
 import java.io.PrintWriter;
+import java.io.RandomAccessFile;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.ShortBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
 import java.util.ArrayList;
 import java.util.HashMap;
 import java.util.HashSet;
 import java.util.Locale;
 import java.util.Set;
 
+import bss_study.DistanceMatrix;
 import eu.quanticol.jsstl.core.formula.Signal;
 import eu.quanticol.jsstl.core.formula.SignalStatistics;
 import eu.quanticol.jsstl.core.formula.jSSTLScript;
@@ -45,9 +53,14 @@ public class EvaluateBSSMulti {
 		System.out.println("Loaded graph.");
 		System.out.println("\tlocations: " + graph.getLocations());
 		System.out.println("\t#edges: " + graph.getEdges().size());
-		// compute the distance matrix for the graph (shortest distances between all locations)
+		// load the distance matrix for the graph (shortest distances between all locations)
+		// written by the graph generation or compute it, if it is missing or outdated
 		double dMcomputationTime = System.currentTimeMillis();
-		graph.dMcomputation();
+		if (DistanceMatrix.load(graph, "model.dist", "model.tra")) {
+			System.out.println("Loaded distance matrix.");
+		} else {
+			graph.dMcomputation();
+		}
 		dMcomputationTime = (System.currentTimeMillis() - dMcomputationTime) / 1000.0;
 		// load the sstl script
 		System.out.println("Initialized script.");
@@ -234,6 +247,62 @@ public class EvaluateBSSMulti {
 		return s;
 	}
 	
+	/**
+	 * Reads a Trajectory from a file in the binary format written by the simulator
+	 * and turns it into a spatio-temporal signal. The file is mapped into memory.
+	 * Format (little endian): magic bytes "BSSTRAJ1", number of samples (int),
+	 * number of locations (int), time between two samples (double), 8 reserved bytes,
+	 * capacities (short per location), bikes (short per sample and location).
+	 * The slots are the capacities minus the bikes.
+	 * @return Signal corresponding to the given trajectory
+	 * 
+	 * The same WORKAROUND as in readTrajectory is applied.
+	 * 
+	 */
+	public Signal readBinaryTrajectory(GraphModel graph, String filename) throws IOException {
+		ByteBuffer buffer;
+		try (RandomAccessFile file = new RandomAccessFile(filename, "r"); FileChannel channel = file.getChannel()) {
+			buffer = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size()).order(ByteOrder.LITTLE_ENDIAN);
+		}
+		byte[] magic = new byte[8];
+		buffer.get(magic);
+		if (!new String(magic, StandardCharsets.US_ASCII).equals("BSSTRAJ1")) {
+			throw new IOException(filename + " is not a trajectory file");
+		}
+		int timesLength = buffer.getInt();
+		int locLength = buffer.getInt();
+		double step = buffer.getDouble();
+		buffer.getLong();
+		if (locLength != graph.getNumberOfLocations()) {
+			throw new IOException(filename + " has " + locLength + " locations instead of " + graph.getNumberOfLocations());
+		}
+		ShortBuffer values = buffer.asShortBuffer();
+		short[] capacities = new short[locLength];
+		values.get(capacities);
+		double[] times = new double[timesLength + 1]; // WORKAROUND: +1
+		for (int t = 0; t < timesLength; t++) {
+			times[t] = t * step;
+		}
+		times[times.length - 1] = 4320.0; // WORKAROUND
+		// transform data to signal format
+		double[][][] data = new double[locLength][][];
+		for (int l = 0; l < locLength; l++) {
+			data[l] = new double[timesLength + 1][]; // WORKAROUND: +1
+		}
+		for (int t = 0; t < timesLength; t++) {
+			for (int l = 0; l < locLength; l++) {
+				short bikes = values.get();
+				data[l][t] = new double[] {bikes, capacities[l] - bikes};
+			}
+		}
+		// WORKAROUND
+		for (int l = 0; l < locLength; l++) {
+			data[l][timesLength] = data[l][timesLength - 1].clone();
+		}
+		Signal s = new Signal(graph, times, data);
+		return s;
+	}
+	
 	/**
 	 * Function to check the boolean satisfaction of a given {@link formula}.
 	 * 
@@ -268,7 +337,13 @@ public class EvaluateBSSMulti {
 				double[] times = model.timesTraj(traj);
 				double[][][] data = model.dataTraj(traj, locations, times.length, var);
 				Signal s = new Signal(graph, times, data);*/
-			Signal s = readTrajectory(graph, trajPref + i + ".csv");
+			// binary trajectories are preferred over csv files
+			Signal s;
+			if (new File(trajPref + i + ".bin").exists()) {
+				s = readBinaryTrajectory(graph, trajPref + i + ".bin");
+			} else {
+				s = readTrajectory(graph, trajPref + i + ".csv");
+			}
 			// loop through all the parameter values
 			for (int k = 0; k < end; k++) {
 				HashMap<String,Double> parValues = new HashMap<String, Double>();
@@ -24,6 +24,7 @@ import java.util.HashSet;
 import java.util.Locale;
 import java.util.Set;
 
+import bss_study.DistanceMatrix;
 import eu.quanticol.jsstl.core.formula.Signal;
 import eu.quanticol.jsstl.core.formula.SignalStatistics;
 import eu.quanticol.jsstl.core.formula.jSSTLScript;
@@ -44,9 +45,14 @@ public class EvaluateBSS {
 		System.out.println("Loaded graph.");
 		System.out.println("\tlocations: " + graph.getLocations());
 		System.out.println("\t#edges: " + graph.getEdges().size());
-		// compute the distance matrix for the graph (shortest distances between all locations)
+		// load the distance matrix for the graph (shortest distances between all locations)
+		// written by the graph generation or compute it, if it is missing or outdated
 		double dMcomputationTime = System.currentTimeMillis();
-		graph.dMcomputation();
+		if (DistanceMatrix.load(graph, "model.dist", "model.tra")) {
+			System.out.println("Loaded distance matrix.");
+		} else {
+			graph.dMcomputation();
+		}
 		dMcomputationTime = (System.currentTimeMillis() - dMcomputationTime) / 1000.0;
 		// load the sstl script
 		System.out.println("Initialized script.");